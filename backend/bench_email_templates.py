@@ -0,0 +1,66 @@
+"""Measure the cost of rendering order emails.
+
+Usage (from the backend directory):
+
+    python bench_email_templates.py                    # default order sizes
+    python bench_email_templates.py --items 10 1000    # custom order sizes
+    python bench_email_templates.py --repeat 2000
+
+For each order size the customer status email (HTML + text) is rendered with
+the precompiled templates and, for comparison, with a fresh Environment per
+message, which is what parsing and compiling the templates on every send
+would cost.
+"""
+import time
+import uuid
+import argparse
+
+from email_templates import EmailTemplates
+
+
+def make_order(item_count: int) -> dict:
+    items = [
+        {"product_id": str(uuid.uuid4()), "name": f"Produkt {i}", "quantity": (i % 3) + 1, "price": 9.9 + i}
+        for i in range(item_count)
+    ]
+    return {
+        "id": str(uuid.uuid4()),
+        "customer_email": "kunde@example.com",
+        "items": items,
+        "total": sum(item["price"] * item["quantity"] for item in items),
+        "status": "shipped",
+        "tracking_number": "00340434161234567890",
+        "tracking_url": "https://www.dhl.de/de/privatkunden/pakete-empfangen/verfolgen.html?piececode=00340434161234567890",
+        "shipping_carrier": "DHL"
+    }
+
+
+def bench(render, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark email template rendering")
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 10, 100, 1000], help="order sizes to render")
+    parser.add_argument("--repeat", type=int, default=500, help="renders per measurement")
+    args = parser.parse_args()
+
+    templates = EmailTemplates()
+    context = {"status_type": "shipped", "heading": "📦 Ihre Bestellung wurde versendet"}
+
+    print(f"{'items':>6} {'html KB':>8} {'precompiled µs':>15} {'compile per call µs':>20}")
+    for item_count in args.items:
+        order = make_order(item_count)
+        html, text = templates.render("customer_order_status", order=order, **context)
+        precompiled = bench(lambda: templates.render("customer_order_status", order=order, **context), args.repeat)
+        # Fewer rounds: every call re-parses all templates
+        cold_repeat = max(1, args.repeat // 20)
+        cold = bench(lambda: EmailTemplates().render("customer_order_status", order=order, **context), cold_repeat)
+        print(f"{item_count:>6} {len(html) / 1024:>8.1f} {precompiled * 1e6:>15.1f} {cold * 1e6:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
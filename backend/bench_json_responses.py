@@ -0,0 +1,92 @@
+"""Compare the cost of serializing blog list responses.
+
+Usage (from the backend directory):
+
+    python bench_json_responses.py                   # 1000 posts
+    python bench_json_responses.py --posts 100 1000 5000
+    python bench_json_responses.py --repeat 50
+
+Each run serializes the same stored blog documents two ways: the old
+response_model path (ISO strings parsed back into datetimes, every document
+validated as BlogPost, dumped to JSON-compatible data and encoded with the
+standard json module, as FastAPI and Starlette do) and the direct path that
+writes the stored documents to bytes with orjson.
+"""
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime, timezone, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from json_response import dumps
+from server import BlogPost
+
+
+def make_blogs(count: int) -> list:
+    now = datetime.now(timezone.utc)
+    blogs = []
+    for i in range(count):
+        created_at = now - timedelta(hours=i)
+        blogs.append(BlogPost(
+            title=f"Post {i}: Adaptogene im Alltag",
+            content="## Einleitung\n\n" + "Reishi, Cordyceps und Lion's Mane im Überblick. " * 40,
+            keywords="pilze, adaptogene, gesundheit",
+            image_urls=[f"/api/media/{uuid.uuid4().hex}" for _ in range(3)],
+            status="published",
+            created_at=created_at,
+            published_at=created_at
+        ).model_dump())
+    # Stored form: timestamps as ISO strings
+    for blog in blogs:
+        blog["created_at"] = blog["created_at"].isoformat()
+        blog["published_at"] = blog["published_at"].isoformat()
+    return blogs
+
+
+def response_model_path(adapter: TypeAdapter, blogs: list) -> bytes:
+    for blog in blogs:
+        if isinstance(blog.get('created_at'), str):
+            blog['created_at'] = datetime.fromisoformat(blog['created_at'])
+        if blog.get('published_at') and isinstance(blog['published_at'], str):
+            blog['published_at'] = datetime.fromisoformat(blog['published_at'])
+    content = adapter.dump_python(adapter.validate_python(blogs), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def measure(fn, make_input, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        data = make_input()
+        started = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blog list serialization")
+    parser.add_argument("--posts", type=int, nargs="+", default=[1000], help="posts per response")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[BlogPost])
+    for count in args.posts:
+        blogs = make_blogs(count)
+        # Fresh copies, the old path converts timestamps in place
+        make_input = lambda: [dict(blog) for blog in blogs]
+        old = measure(lambda data: response_model_path(adapter, data), make_input, args.repeat)
+        new = measure(dumps, make_input, args.repeat)
+        size = len(dumps(blogs))
+        print(
+            f"{count:>6} posts ({size / 1024:.0f} KiB): "
+            f"response_model {old * 1000:8.2f} ms ({old / count * 1e6:6.1f} µs/post)   "
+            f"orjson {new * 1000:7.2f} ms ({new / count * 1e6:5.1f} µs/post)   "
+            f"{old / new:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
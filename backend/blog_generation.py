@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional, AsyncIterator
+
+from timestamps import as_datetime
+
+# AI blog generation as background jobs.
+# POST /blogs/generate only creates a job document and returns its id; the
+# LLM completion and the cover image search run in a background task. The
+# job document in `generation_jobs` is updated as text arrives, so any
+# worker can answer status polls, and clients on the same worker can follow
+# the tokens live over SSE. The LLM sits behind a small backend interface so
+# tests can swap in a canned stub (LLM_BACKEND=stub). Finished drafts are
+# cached per keywords/model/prompt version (see generation_cache.py).
+
+SYSTEM_PROMPT = (
+    "You are an expert writer specializing in health, nature, consciousness, spirituality, and holistic wellness. "
+    "Write engaging, informative blog posts that are SEO-friendly and educational. Cover topics like natural remedies, "
+    "mindfulness, nutrition, herbal medicine, sustainable living, and personal growth. Focus on scientific facts when "
+    "available, practical applications, and inspiring content."
+)
+GEMINI_MODEL = "gemini-2.0-flash-lite"
+# Bump when SYSTEM_PROMPT or build_prompt change, so cached drafts aren't reused
+PROMPT_VERSION = "1"
+# Partial content is written to Mongo at most this often while streaming
+FLUSH_INTERVAL_SECONDS = 1.0
+# A running job that hasn't been updated for this long was lost (e.g. restart)
+STALE_JOB_SECONDS = 5 * 60
+JOB_RETENTION = timedelta(days=1)
+
+
+def build_prompt(keywords: str) -> str:
+    return (
+        f"Write a comprehensive blog post about: {keywords}. Include an engaging title, detailed content with sections "
+        "covering the main topic, benefits, scientific research (if applicable), practical applications, and important "
+        "considerations. Make it around 800-1200 words. Format with proper headings using markdown. Be creative and informative."
+    )
+
+
+def split_title(text: str, fallback: str):
+    """The first line of the completion is the title, the rest is the body."""
+    lines = text.strip().split('\n')
+    title = lines[0].replace('#', '').strip() if lines and lines[0].strip() else fallback
+    content = '\n'.join(lines[1:]).strip() if len(lines) > 1 else text
+    return title, content
+
+
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL):
+        from google import genai
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    async def stream(self, system: str, prompt: str) -> AsyncIterator[str]:
+        from google.genai import types
+        response = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=types.GenerateContentConfig(system_instruction=system)
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend:
+    """Offline backend that streams a canned markdown post word by word."""
+
+    name = "stub"
+    model = "stub"
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+
+    async def stream(self, system: str, prompt: str) -> AsyncIterator[str]:
+        topic = prompt.split("about: ", 1)[-1].split(".", 1)[0]
+        text = (
+            f"# {topic[:1].upper()}{topic[1:]}: A Practical Guide\n\n"
+            f"## Introduction\n\nThis is a generated draft about {topic}.\n\n"
+            "## Benefits\n\n- Calm focus\n- Better sleep\n\n"
+            "## Considerations\n\nTalk to a professional before changing your routine.\n"
+        )
+        for word in text.split(" "):
+            await asyncio.sleep(self.delay)
+            yield word + " "
+
+
+def create_llm_backend():
+    backend = os.environ.get('LLM_BACKEND', 'gemini').lower()
+    if backend == "stub":
+        logging.info("Using stub LLM backend for blog generation")
+        return StubBackend()
+    return GeminiBackend(os.environ.get('GEMINI_API_KEY'))
+
+
+class _LiveJob:
+    # In-process state of a running job: streamed text and SSE subscribers
+    def __init__(self):
+        self.parts = []
+        self.subscribers = set()
+
+    def publish(self, event: str, data: dict):
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class BlogGenerationJobs:
+    def __init__(self, db, backend=None, fetch_image=None, cache=None):
+        self.db = db
+        self._backend = backend
+        self.fetch_image = fetch_image
+        self.cache = cache
+        self._live = {}
+        self._tasks = set()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = create_llm_backend()
+        return self._backend
+
+    async def submit(self, keywords: str, force: bool = False) -> dict:
+        """Start a generation job; force=True skips the generation cache."""
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "keywords": keywords,
+            "status": "queued",
+            "title": None,
+            "content": "",
+            "image_url": None,
+            "error": None,
+            "cached": False,
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "expires_at": now + JOB_RETENTION
+        }
+        cached = None
+        if self.cache and not force:
+            cached = await self.cache.get(keywords, self.backend.model, PROMPT_VERSION)
+        if cached:
+            job.update({
+                "status": "done",
+                "title": cached["title"],
+                "content": cached["content"],
+                "image_url": cached["image_url"],
+                "cached": True,
+                "finished_at": now
+            })
+            await self.db.generation_jobs.insert_one(dict(job))
+            logging.info(f"Blog generation for '{keywords}' served from cache")
+            return job
+
+        await self.db.generation_jobs.insert_one(dict(job))
+        self._live[job["id"]] = _LiveJob()
+        task = asyncio.create_task(self._run(job["id"], keywords))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _update(self, job_id: str, fields: dict):
+        fields["updated_at"] = datetime.now(timezone.utc)
+        await self.db.generation_jobs.update_one({"id": job_id}, {"$set": fields})
+
+    async def _run(self, job_id: str, keywords: str):
+        live = self._live[job_id]
+        started = time.monotonic()
+        # The image search doesn't depend on the text, so run it alongside
+        image_task = asyncio.create_task(self.fetch_image(keywords)) if self.fetch_image else None
+        try:
+            await self._update(job_id, {"status": "running"})
+            live.publish("status", {"status": "running"})
+            last_flush = time.monotonic()
+            async for text in self.backend.stream(SYSTEM_PROMPT, build_prompt(keywords)):
+                live.parts.append(text)
+                live.publish("token", {"text": text})
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+                    await self._update(job_id, {"content": "".join(live.parts)})
+                    last_flush = time.monotonic()
+
+            title, content = split_title("".join(live.parts), keywords)
+            image_url = None
+            if image_task:
+                try:
+                    image_url = await image_task
+                except Exception as e:
+                    logging.warning(f"Failed to fetch image for blog generation: {str(e)}")
+            result = {"title": title, "content": content, "image_url": image_url}
+            await self._update(job_id, {
+                **result,
+                "status": "done",
+                "finished_at": datetime.now(timezone.utc)
+            })
+            live.publish("done", {"job_id": job_id, "status": "done", **result})
+            if self.cache:
+                try:
+                    await self.cache.put(keywords, self.backend.model, PROMPT_VERSION, result)
+                except Exception as e:
+                    logging.warning(f"Failed to cache blog generation: {str(e)}")
+            logging.info(f"Blog generation job {job_id} finished in {time.monotonic() - started:.1f}s")
+        except Exception as e:
+            if image_task:
+                image_task.cancel()
+            logging.error(f"Error generating blog (job {job_id}): {str(e)}")
+            await self._update(job_id, {
+                "status": "failed",
+                "content": "".join(live.parts),
+                "error": str(e),
+                "finished_at": datetime.now(timezone.utc)
+            })
+            live.publish("error", {"job_id": job_id, "status": "failed", "error": str(e)})
+        finally:
+            self._live.pop(job_id, None)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await self.db.generation_jobs.find_one({"id": job_id}, {"_id": 0, "expires_at": 0})
+        if not job:
+            return None
+        live = self._live.get(job_id)
+        if live is not None:
+            # Fresher than the last flush to Mongo
+            job["content"] = "".join(live.parts)
+        elif job["status"] in ("queued", "running"):
+            if datetime.now(timezone.utc) - as_datetime(job["updated_at"]) > timedelta(seconds=STALE_JOB_SECONDS):
+                job["status"] = "failed"
+                job["error"] = "Generation was interrupted"
+        return job
+
+    async def events(self, job_id: str, poll_interval: float = 1.0) -> AsyncIterator[str]:
+        """SSE stream for a job: the text so far, then live tokens until done."""
+        live = self._live.get(job_id)
+        if live is not None:
+            queue = asyncio.Queue()
+            live.subscribers.add(queue)
+            try:
+                if live.parts:
+                    yield sse_event("token", {"text": "".join(live.parts)})
+                while True:
+                    event, data = await queue.get()
+                    yield sse_event(event, data)
+                    if event in ("done", "error"):
+                        return
+            finally:
+                live.subscribers.discard(queue)
+
+        # Job runs on another worker (or is already finished): follow Mongo
+        sent = 0
+        while True:
+            job = await self.get(job_id)
+            if not job:
+                yield sse_event("error", {"job_id": job_id, "status": "failed", "error": "Job not found"})
+                return
+            if job["status"] == "done":
+                yield sse_event("done", {
+                    "job_id": job_id, "status": "done",
+                    "title": job["title"], "content": job["content"], "image_url": job["image_url"]
+                })
+                return
+            if job["status"] == "failed":
+                yield sse_event("error", {"job_id": job_id, "status": "failed", "error": job["error"]})
+                return
+            if len(job["content"]) > sent:
+                yield sse_event("token", {"text": job["content"][sent:]})
+                sent = len(job["content"])
+            await asyncio.sleep(poll_interval)
+
+    async def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
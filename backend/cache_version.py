@@ -0,0 +1,68 @@
+import time
+import asyncio
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from timestamps import as_datetime
+
+# Cross-worker cache invalidation.
+# A named counter document in the settings collection is incremented on
+# every write to the cached data. Each worker remembers the version its
+# cache was built from and re-reads the counter at most every
+# `check_interval` seconds, so staying in sync costs one indexed lookup per
+# interval instead of one query per request. The counter also records when
+# it last moved, which doubles as Last-Modified for conditional GETs.
+
+VERSION_CHECK_SECONDS = 2.0
+
+
+class VersionCounter:
+    def __init__(self, db, name: str, check_interval: float = VERSION_CHECK_SECONDS):
+        self.db = db
+        self.query = {"type": name}
+        self.check_interval = check_interval
+        self.seen = None
+        self.modified = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _due(self) -> bool:
+        return self.seen is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def _remember(self, doc: Optional[dict]):
+        doc = doc or {}
+        self.seen = doc.get("version", 0)
+        modified = doc.get("updated_at")
+        if modified is not None:
+            # tz_aware clients return bson's own UTC tzinfo, which usegmt formatting rejects
+            modified = as_datetime(modified).astimezone(timezone.utc)
+        self.modified = modified
+        self._checked_at = time.monotonic()
+
+    async def refresh(self) -> int:
+        """Re-read the counter now, regardless of check_interval."""
+        self._remember(await self.db.settings.find_one(self.query, {"_id": 0, "version": 1, "updated_at": 1}))
+        return self.seen
+
+    async def check(self) -> Optional[int]:
+        """The new version if the counter moved since it was last seen, else None."""
+        if not self._due():
+            return None
+        async with self._lock:
+            if not self._due():
+                return None
+            previous = self.seen
+            await self.refresh()
+            return None if self.seen == previous else self.seen
+
+    async def bump(self) -> int:
+        doc = await self.db.settings.find_one_and_update(
+            self.query,
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._remember(doc)
+        return self.seen
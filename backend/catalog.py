@@ -0,0 +1,84 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from cache_version import VersionCounter
+from json_response import dumps
+
+# In-memory product catalog.
+# Products (database entries plus the built-in defaults) are held in a dict
+# keyed by id with secondary indexes by category and type, and the full
+# /api/products response is serialized once per rebuild. The catalog is only
+# rebuilt after a product write. Writes also bump the `catalog_version`
+# counter, which other workers check at most every VERSION_CHECK_SECONDS so
+# their copies don't go stale (see cache_version.py).
+
+VERSION_CHECK_SECONDS = 5.0
+
+
+class ProductCatalog:
+    def __init__(self, db, default_products: list):
+        self.db = db
+        self.default_products = default_products
+        self.products = {}
+        self.by_category = {}
+        self.by_type = {}
+        self.serialized = b"[]"
+        self.version = VersionCounter(db, "catalog_version", VERSION_CHECK_SECONDS)
+        self._lock = asyncio.Lock()
+        self.stats = {"rebuilds": 0}
+
+    async def rebuild(self):
+        started = time.monotonic()
+        products = {}
+        # Database products come first and win over defaults with the same id
+        async for product in self.db.products.find({}, {"_id": 0}):
+            products.setdefault(product.get("id"), product)
+        for product in self.default_products:
+            products.setdefault(product["id"], product)
+
+        by_category, by_type = {}, {}
+        for product_id, product in products.items():
+            by_category.setdefault(product.get("category"), []).append(product_id)
+            by_type.setdefault(product.get("type"), []).append(product_id)
+
+        self.products = products
+        self.by_category = by_category
+        self.by_type = by_type
+        self.serialized = dumps(list(products.values()))
+        self.stats["rebuilds"] += 1
+        logging.info(f"Product catalog rebuilt: {len(products)} products in {(time.monotonic() - started) * 1000:.1f} ms")
+
+    async def ensure_fresh(self):
+        # Held across the check so requests wait for an in-progress rebuild
+        async with self._lock:
+            if await self.version.check() is not None:
+                await self.rebuild()
+
+    async def invalidate(self):
+        """Call after any write to the products collection."""
+        await self.version.bump()
+        async with self._lock:
+            await self.rebuild()
+
+    async def list(self, category: Optional[str] = None, product_type: Optional[str] = None) -> list:
+        await self.ensure_fresh()
+        ids = None
+        if category is not None:
+            ids = self.by_category.get(category, [])
+        if product_type is not None:
+            type_ids = self.by_type.get(product_type, [])
+            if ids is None:
+                ids = type_ids
+            else:
+                type_set = set(type_ids)
+                ids = [i for i in ids if i in type_set]
+        if ids is None:
+            return list(self.products.values())
+        return [self.products[i] for i in ids]
+
+    async def response_body(self) -> bytes:
+        """Pre-serialized JSON of the full catalog."""
+        await self.ensure_fresh()
+        return self.serialized
@@ -0,0 +1,80 @@
+"""Check SMTP connection reuse against a local aiosmtpd server.
+
+Usage (from the backend directory; needs `pip install aiosmtpd`):
+
+    python check_smtp_pool.py                      # 20 messages, pool of 2
+    python check_smtp_pool.py --messages 200 --pool-size 4
+
+Starts an in-process SMTP server that accepts any login (no TLS), sends the
+messages concurrently through SMTPConnectionPool and reports how many
+connections the server saw. With a working pool that is at most the pool
+size (plus one per max_messages rollover), not one per message.
+"""
+import asyncio
+import argparse
+from email.mime.text import MIMEText
+
+from smtp_pool import SMTPConnectionPool
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    raise SystemExit("aiosmtpd is required: pip install aiosmtpd")
+
+
+class CountingHandler:
+    def __init__(self):
+        self.peers = set()
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        # Every TCP connection has its own client port
+        self.peers.add(session.peer)
+        self.messages += 1
+        return "250 OK"
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def build_message(index: int) -> MIMEText:
+    message = MIMEText(f"Message {index}")
+    message["From"] = "shop@example.com"
+    message["To"] = "customer@example.com"
+    message["Subject"] = f"Pool check {index}"
+    return message
+
+
+async def run(messages: int, pool_size: int, port: int) -> dict:
+    handler = CountingHandler()
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=port,
+        authenticator=accept_any_login, auth_require_tls=False
+    )
+    controller.start()
+    pool = SMTPConnectionPool("127.0.0.1", port, "user", "password", start_tls=False, size=pool_size)
+    try:
+        await asyncio.gather(*(pool.send(build_message(i)) for i in range(messages)))
+    finally:
+        await pool.close()
+        controller.stop()
+    return {"messages": handler.messages, "connections": len(handler.peers), "pool": pool.stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check SMTP connection reuse against aiosmtpd")
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8925)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.messages, args.pool_size, args.port))
+    print(f"{result['messages']} messages over {result['connections']} connections (pool stats: {result['pool']})")
+    if result["connections"] > args.pool_size * (1 + args.messages // 100):
+        raise SystemExit("Connections were not reused")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import os
+import uuid
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from smtp_pool import SMTPConnectionPool
+from timestamps import range_query
+
+# Durable outbound email queue.
+# Request handlers only insert into the `email_outbox` collection; a
+# background worker claims due messages and talks to SMTP, retrying with
+# exponential backoff. Messages that keep failing are parked with
+# status "dead" for inspection instead of being retried forever.
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+LOCK_SECONDS = 5 * 60
+POLL_INTERVAL_SECONDS = 5
+
+
+def smtp_settings() -> Optional[dict]:
+    settings = {
+        "hostname": os.environ.get('SMTP_HOST'),
+        "port": int(os.environ.get('SMTP_PORT', 587)),
+        "username": os.environ.get('SMTP_USER'),
+        "password": os.environ.get('SMTP_PASSWORD'),
+        "start_tls": os.environ.get('SMTP_STARTTLS', 'true').lower() != 'false',
+    }
+    if not all([settings["hostname"], settings["username"], settings["password"]]):
+        return None
+    return settings
+
+
+def build_message(doc: dict, sender: str) -> MIMEMultipart:
+    message = MIMEMultipart("alternative")
+    message["From"] = sender
+    message["To"] = doc["to"]
+    message["Subject"] = doc["subject"]
+    if doc.get("text"):
+        message.attach(MIMEText(doc["text"], "plain"))
+    message.attach(MIMEText(doc["html"], "html"))
+    return message
+
+
+_smtp_pool = None
+
+
+async def get_smtp_pool() -> SMTPConnectionPool:
+    """Shared connection pool, rebuilt if the SMTP settings change."""
+    global _smtp_pool
+    settings = smtp_settings()
+    if not settings:
+        raise RuntimeError("Email configuration incomplete")
+    if _smtp_pool is None or any(getattr(_smtp_pool, key) != value for key, value in settings.items()):
+        previous = _smtp_pool
+        _smtp_pool = SMTPConnectionPool(size=int(os.environ.get('SMTP_POOL_SIZE', 2)), **settings)
+        if previous is not None:
+            # Swap first so concurrent senders already use the new pool
+            try:
+                await previous.close()
+            except Exception as e:
+                logging.warning(f"Failed to close previous SMTP pool: {str(e)}")
+    return _smtp_pool
+
+
+async def smtp_send(message):
+    await (await get_smtp_pool()).send(message)
+
+
+async def close_smtp_pool():
+    global _smtp_pool
+    if _smtp_pool is not None:
+        await _smtp_pool.close()
+        _smtp_pool = None
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def backoff_delay(attempts: int) -> float:
+    delay = min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+    # Jitter so a burst of failures doesn't retry in lockstep
+    return delay * random.uniform(0.8, 1.2)
+
+
+class EmailOutbox:
+    def __init__(self, db, send=smtp_send):
+        self.db = db
+        self.send = send
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def enqueue(self, to: str, subject: str, html: str, text: Optional[str] = None,
+                      idempotency_key: Optional[str] = None) -> Optional[str]:
+        """Queue an email. Returns the outbox id, or None if email is not configured.
+
+        Enqueuing the same idempotency_key twice only stores the first message.
+        """
+        if not smtp_settings():
+            logging.warning(f"Email configuration incomplete, skipping email '{subject}'")
+            return None
+        if not to:
+            logging.warning(f"No recipient for email '{subject}', skipping")
+            return None
+
+        now = _now()
+        doc = {
+            "id": str(uuid.uuid4()),
+            "idempotency_key": idempotency_key or str(uuid.uuid4()),
+            "to": to,
+            "subject": subject,
+            "html": html,
+            "text": text,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "locked_until": None,
+            "last_error": None,
+            "created_at": now,
+            "sent_at": None
+        }
+        result = await self.db.email_outbox.update_one(
+            {"idempotency_key": doc["idempotency_key"]},
+            {"$setOnInsert": doc},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            logging.info(f"Email with idempotency key {doc['idempotency_key']} already queued")
+            existing = await self.db.email_outbox.find_one({"idempotency_key": doc["idempotency_key"]}, {"_id": 0, "id": 1})
+            return existing["id"] if existing else None
+
+        self._wakeup.set()
+        return doc["id"]
+
+    async def claim_next(self) -> Optional[dict]:
+        """Atomically lock the oldest due message (or one whose lock expired)."""
+        now = _now()
+        doc = await self.db.email_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", **range_query("next_attempt_at", lte=now)},
+                {"status": "sending", **range_query("locked_until", lte=now)}
+            ]},
+            {
+                "$set": {"status": "sending", "locked_until": now + timedelta(seconds=LOCK_SECONDS)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if doc:
+            doc.pop("_id", None)
+        return doc
+
+    async def deliver(self, doc: dict):
+        settings = smtp_settings()
+        try:
+            if not settings:
+                raise RuntimeError("Email configuration incomplete")
+            await self.send(build_message(doc, settings["username"]))
+        except Exception as e:
+            if doc["attempts"] >= MAX_ATTEMPTS:
+                status, next_attempt = "dead", None
+                logging.error(f"Email {doc['id']} to {doc['to']} moved to dead letter after {doc['attempts']} attempts: {str(e)}")
+            else:
+                status = "pending"
+                next_attempt = _now() + timedelta(seconds=backoff_delay(doc["attempts"]))
+                logging.warning(f"Email {doc['id']} to {doc['to']} failed (attempt {doc['attempts']}), retrying at {next_attempt.isoformat()}: {str(e)}")
+            await self.db.email_outbox.update_one(
+                {"id": doc["id"]},
+                {"$set": {"status": status, "next_attempt_at": next_attempt, "locked_until": None, "last_error": str(e)}}
+            )
+            return False
+
+        await self.db.email_outbox.update_one(
+            {"id": doc["id"]},
+            {"$set": {"status": "sent", "sent_at": _now(), "locked_until": None, "last_error": None}}
+        )
+        logging.info(f"Email '{doc['subject']}' sent to {doc['to']}")
+        return True
+
+    async def drain(self, concurrency: Optional[int] = None) -> int:
+        """Send every due message; returns how many were attempted.
+
+        Runs one sender per pooled SMTP connection so a batch of
+        notifications is spread over already authenticated sessions.
+        """
+        concurrency = concurrency or int(os.environ.get('SMTP_POOL_SIZE', 2))
+
+        async def sender():
+            count = 0
+            while True:
+                doc = await self.claim_next()
+                if not doc:
+                    return count
+                await self.deliver(doc)
+                count += 1
+
+        counts = await asyncio.gather(*(sender() for _ in range(concurrency)))
+        return sum(counts)
+
+    async def run(self):
+        while True:
+            # Clear before draining so an enqueue during the drain isn't missed
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Email outbox worker error: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await close_smtp_pool()
+
+    async def retry(self, outbox_id: str) -> bool:
+        """Move a dead-lettered message back into the queue."""
+        result = await self.db.email_outbox.update_one(
+            {"id": outbox_id, "status": "dead"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": _now(), "last_error": None}}
+        )
+        if result.modified_count:
+            self._wakeup.set()
+        return result.modified_count > 0
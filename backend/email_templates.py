@@ -0,0 +1,54 @@
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+
+# Email templates.
+# Every email has an HTML template and a plain-text twin in templates/email.
+# All templates are compiled once when EmailTemplates is created; partials
+# that never change (branded header, footers) are rendered once and injected
+# as ready-made markup instead of being re-rendered for every message.
+
+TEMPLATE_DIR = Path(__file__).parent / 'templates' / 'email'
+
+# Static partials rendered once and exposed to templates as `fragments.<name>`
+STATIC_FRAGMENTS = {
+    "brand_header": "_brand_header.html",
+    "customer_footer": "_customer_footer.html",
+    "admin_footer": "_admin_footer.html",
+}
+
+
+def format_euro(value) -> str:
+    return f"{float(value or 0):.2f}"
+
+
+class EmailTemplates:
+    def __init__(self, template_dir: Path = TEMPLATE_DIR):
+        self.env = Environment(
+            loader=FileSystemLoader(str(template_dir)),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            # Templates never change while the server runs
+            auto_reload=False,
+            cache_size=-1
+        )
+        self.env.filters["euro"] = format_euro
+        self.env.globals["fragments"] = {
+            name: Markup(self.env.get_template(path).render())
+            for name, path in STATIC_FRAGMENTS.items()
+        }
+        self.templates = {
+            name: self.env.get_template(name)
+            for name in self.env.list_templates(extensions=["html", "txt"])
+            if not name.startswith("_")
+        }
+
+    def render(self, name: str, **context) -> Tuple[str, Optional[str]]:
+        """Render `<name>.html` and `<name>.txt`; returns (html, text)."""
+        context.setdefault("now", datetime.now(timezone.utc))
+        html = self.templates[f"{name}.html"].render(context)
+        text_template = self.templates.get(f"{name}.txt")
+        text = text_template.render(context) if text_template else None
+        return html, text
@@ -0,0 +1,79 @@
+import os
+import re
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+# Cache of AI blog generations.
+# Entries live in the `generation_cache` collection so they survive restarts
+# and are shared by every uvicorn worker. An entry is keyed by the normalized
+# keywords plus the model and prompt version, so changing either one never
+# serves a stale draft. Entries expire after a TTL (Mongo TTL index on
+# expires_at) and the collection is trimmed to a maximum size by evicting
+# the least recently used entries.
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_keywords(keywords: str) -> str:
+    """Case, width and whitespace insensitive form of a keyword string."""
+    text = unicodedata.normalize("NFKC", keywords).casefold()
+    return WHITESPACE_RE.sub(" ", text).strip(" .,;:!?")
+
+
+def cache_key(keywords: str, model: str, prompt_version: str) -> str:
+    raw = f"{prompt_version}\x00{model}\x00{normalize_keywords(keywords)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    def __init__(self, db, ttl: Optional[timedelta] = None, max_entries: Optional[int] = None):
+        self.db = db
+        self.ttl = ttl or timedelta(hours=int(os.environ.get('GENERATION_CACHE_TTL_HOURS', 24 * 7)))
+        self.max_entries = max_entries or int(os.environ.get('GENERATION_CACHE_MAX_ENTRIES', 500))
+
+    async def get(self, keywords: str, model: str, prompt_version: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        # Bumping last_used_at on read is what makes eviction LRU
+        entry = await self.db.generation_cache.find_one_and_update(
+            {"key": cache_key(keywords, model, prompt_version), "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not entry:
+            return None
+        return {field: entry.get(field) for field in ("title", "content", "image_url", "hits")}
+
+    async def put(self, keywords: str, model: str, prompt_version: str, result: dict):
+        now = datetime.now(timezone.utc)
+        await self.db.generation_cache.update_one(
+            {"key": cache_key(keywords, model, prompt_version)},
+            {"$set": {
+                "keywords": normalize_keywords(keywords),
+                "model": model,
+                "prompt_version": prompt_version,
+                "title": result["title"],
+                "content": result["content"],
+                "image_url": result.get("image_url"),
+                "hits": 0,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + self.ttl
+            }},
+            upsert=True
+        )
+        await self.evict()
+
+    async def evict(self):
+        """Drop least recently used entries beyond max_entries."""
+        excess = await self.db.generation_cache.count_documents({}) - self.max_entries
+        if excess <= 0:
+            return 0
+        stale = await self.db.generation_cache.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess).to_list(excess)
+        result = await self.db.generation_cache.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+        logging.info(f"Evicted {result.deleted_count} generation cache entries")
+        return result.deleted_count
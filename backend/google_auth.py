@@ -0,0 +1,125 @@
+import re
+import time
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+from jose import jwt, JWTError
+
+# Google ID token verification against locally cached signing keys.
+# Google publishes its JWKS with a Cache-Control max-age (usually several
+# hours). The key set is kept in memory for that long and refreshed in the
+# background before it goes stale, so verifying a sign-in is a local RSA
+# signature check without an outbound request.
+
+GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_MAX_AGE_SECONDS = 60 * 60
+# Refresh this long before the cached keys expire
+REFRESH_MARGIN_SECONDS = 5 * 60
+# An unknown key id triggers a refetch (key rotation), at most this often
+MIN_REFETCH_INTERVAL_SECONDS = 60
+CLOCK_SKEW_SECONDS = 10
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def cache_lifetime(response: httpx.Response) -> int:
+    """Seconds the response may be cached, from Cache-Control max-age minus Age."""
+    match = MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+    max_age = int(match.group(1)) if match else DEFAULT_MAX_AGE_SECONDS
+    try:
+        age = int(response.headers.get("age", 0))
+    except ValueError:
+        age = 0
+    return max(max_age - age, 0)
+
+
+class GoogleKeyCache:
+    def __init__(self, url: str = GOOGLE_JWKS_URL, http: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self._http = http
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.stats = {"fetches": 0, "verifications": 0}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10.0)
+        return self._http
+
+    async def refresh(self):
+        async with self._lock:
+            response = await self.http.get(self.url)
+            response.raise_for_status()
+            self._keys = {key["kid"]: key for key in response.json().get("keys", [])}
+            lifetime = cache_lifetime(response)
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + lifetime
+            self.stats["fetches"] += 1
+            logging.info(f"Fetched {len(self._keys)} Google signing keys (cached for {lifetime}s)")
+
+    async def get_key(self, kid: str) -> dict:
+        if not self._keys or time.monotonic() >= self._expires_at:
+            await self.refresh()
+        elif kid not in self._keys and time.monotonic() - self._fetched_at >= MIN_REFETCH_INTERVAL_SECONDS:
+            # Google may have rotated keys before our copy expired
+            await self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise ValueError(f"Unknown Google signing key {kid}")
+        return key
+
+    async def verify(self, token: str, client_id: str) -> dict:
+        """Verify a Google ID token and return its claims; raises ValueError if invalid."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise ValueError(f"Malformed token: {str(e)}")
+        key = await self.get_key(header.get("kid"))
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=["RS256"],
+                audience=client_id,
+                issuer=GOOGLE_ISSUERS,
+                options={"leeway": CLOCK_SKEW_SECONDS, "verify_at_hash": False}
+            )
+        except JWTError as e:
+            raise ValueError(str(e))
+        self.stats["verifications"] += 1
+        return claims
+
+    async def _refresh_loop(self):
+        while True:
+            if self._keys:
+                delay = self._expires_at - time.monotonic() - REFRESH_MARGIN_SECONDS
+                await asyncio.sleep(max(delay, MIN_REFETCH_INTERVAL_SECONDS))
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Keep serving the cached keys; get_key refetches once they expire
+                logging.warning(f"Background refresh of Google signing keys failed: {str(e)}")
+                await asyncio.sleep(MIN_REFETCH_INTERVAL_SECONDS)
+
+    def start(self):
+        """Prefetch the keys and keep them fresh in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,125 @@
+import io
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image, ImageOps
+
+from media_store import media_url
+
+# Responsive image derivatives.
+# Every stored image gets downscaled copies (WebP plus a JPEG fallback) that
+# are themselves stored in the media store. Resizing is CPU bound, so it runs
+# in a process pool and never on the event loop.
+
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+DERIVATIVE_FORMATS = {
+    "image/webp": ("WEBP", {"quality": 80, "method": 4}),
+    "image/jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# Animated/vector formats are served as uploaded
+SKIPPED_TYPES = {"image/gif", "image/svg+xml"}
+
+
+def render_derivatives(data: bytes, widths=DERIVATIVE_WIDTHS):
+    """Resize an image into every target width and format.
+
+    Runs inside a worker process. Returns the original dimensions and a list
+    of (width, content_type, bytes) tuples. Images are never upscaled; an
+    image narrower than the largest width gets one copy at its own width.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        targets = sorted({w for w in widths if w < width} | {min(width, max(widths))})
+        results = []
+        for target_width in targets:
+            target_height = max(1, round(height * target_width / width))
+            resized = image.resize((target_width, target_height), Image.LANCZOS) if target_width != width else image
+            for content_type, (pil_format, options) in DERIVATIVE_FORMATS.items():
+                frame = resized.convert("RGB") if pil_format == "JPEG" and resized.mode != "RGB" else resized
+                buffer = io.BytesIO()
+                frame.save(buffer, pil_format, **options)
+                results.append((target_width, content_type, buffer.getvalue()))
+        return width, height, results
+
+
+def build_srcset(media_doc: dict) -> dict:
+    """Map each derivative content type to an HTML srcset string."""
+    srcset = {}
+    for content_type, by_width in (media_doc.get("derivatives") or {}).items():
+        entries = sorted(by_width.items(), key=lambda item: int(item[0]))
+        srcset[content_type] = ", ".join(f"{media_url(media_id)} {width}w" for width, media_id in entries)
+    return srcset
+
+
+class ImageDerivativePipeline:
+    def __init__(self, media_store, max_workers=None):
+        self.media_store = media_store
+        self.max_workers = max_workers or int(os.environ.get('IMAGE_WORKERS', 2))
+        self._executor = None
+        self._pending = {}
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            # spawn: the server process holds Mongo client threads, which
+            # must not be forked
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def generate(self, media_id: str) -> dict:
+        """Create derivatives for a stored image (no-op if they exist)."""
+        info = await self.media_store.get_info(media_id)
+        if not info or "derivatives" in info:
+            return info
+        if not info["content_type"].startswith("image/") or info["content_type"] in SKIPPED_TYPES:
+            return info
+
+        data = await self.media_store.read(media_id)
+        loop = asyncio.get_running_loop()
+        try:
+            width, height, rendered = await loop.run_in_executor(self.executor, render_derivatives, data)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM on a huge image); start a fresh pool next time
+            self._executor = None
+            raise
+
+        derivatives = {}
+        for target_width, content_type, payload in rendered:
+            stored = await self.media_store.save(payload, content_type)
+            derivatives.setdefault(content_type, {})[str(target_width)] = stored["id"]
+
+        await self.media_store.update_info(media_id, {"width": width, "height": height, "derivatives": derivatives})
+        logging.info(f"Generated {len(rendered)} derivatives for media {media_id}")
+        return await self.media_store.get_info(media_id)
+
+    def schedule(self, media_id: str):
+        """Generate derivatives in the background, once per media id."""
+        if media_id in self._pending:
+            return self._pending[media_id]
+        task = asyncio.create_task(self._run(media_id))
+        self._pending[media_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(media_id, None))
+        return task
+
+    async def _run(self, media_id: str):
+        try:
+            await self.generate(media_id)
+        except Exception as e:
+            logging.error(f"Failed to generate derivatives for media {media_id}: {str(e)}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,31 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# Fast JSON responses.
+# Stored documents are already in their response shape: request models
+# validate everything on the way in, so list endpoints can write the Mongo
+# documents straight to bytes with orjson instead of re-validating each one
+# through a response_model. datetimes (aware, or naive UTC as returned by
+# Motor) are written as ISO 8601 strings.
+
+DUMPS_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=DUMPS_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,82 @@
+"""Check that login bursts don't slow down unrelated endpoints.
+
+Usage (against a running backend):
+
+    python loadtest_login.py --base-url http://localhost:8001 \\
+        --email loadtest@example.com --password secret123
+
+The account is registered first if it does not exist. The script measures
+`GET /api/blogs` latency twice, once on an idle server and once while
+`--concurrency` clients send logins in a loop, and prints p50/p99 for both
+together with the password hashing pool metrics.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+import httpx
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def probe(client, duration, interval):
+    latencies = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/api/blogs")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def login_loop(client, email, password, stop):
+    count = 0
+    while not stop.is_set():
+        response = await client.post("/api/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+def report(label, latencies):
+    print(f"{label:<14} n={len(latencies):<5} p50={statistics.median(latencies):7.1f} ms  p99={percentile(latencies, 99):7.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Blog latency under a login burst")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--email", default="loadtest@example.com")
+    parser.add_argument("--password", default="loadtest-password")
+    parser.add_argument("--concurrency", type=int, default=20, help="parallel login clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--interval", type=float, default=0.05, help="pause between blog probes")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as client:
+        await client.post("/api/auth/register", json={
+            "email": args.email, "password": args.password, "first_name": "Load", "last_name": "Test"
+        })
+
+        report("idle", await probe(client, args.duration, args.interval))
+
+        stop = asyncio.Event()
+        logins = [asyncio.create_task(login_loop(client, args.email, args.password, stop)) for _ in range(args.concurrency)]
+        burst = await probe(client, args.duration, args.interval)
+        stop.set()
+        login_count = sum(await asyncio.gather(*logins))
+        report("login burst", burst)
+        print(f"logins: {login_count} ({login_count / args.duration:.1f}/s)")
+
+        metrics = await client.get("/api/admin/metrics/password-hashing")
+        print(f"password hashing: {metrics.json()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
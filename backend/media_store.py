@@ -0,0 +1,219 @@
+import os
+import hashlib
+import logging
+import asyncio
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+# Content-addressed media storage.
+# Blobs are keyed by the sha256 of their bytes, so identical uploads collapse
+# into one stored object. Metadata (content type, size) lives in the `media`
+# collection for every backend; only the bytes location differs.
+
+MEDIA_URL_PREFIX = "/api/media/"
+CHUNK_SIZE = 64 * 1024
+
+
+def media_url(media_id: str) -> str:
+    return f"{MEDIA_URL_PREFIX}{media_id}"
+
+
+def is_valid_media_id(media_id: str) -> bool:
+    return len(media_id) == 64 and all(c in "0123456789abcdef" for c in media_id)
+
+
+def parse_range_header(range_header: str, size: int):
+    """Parse a single `bytes=` range into an inclusive (start, end) tuple.
+
+    Returns None when the header should be ignored (malformed or multiple
+    ranges) and raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep or not (first or last) or not (first or "0").isdigit() or not (last or "0").isdigit():
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        # Also covers open-ended ranges past the end (end defaults to size - 1)
+        raise ValueError("Range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _spool_to_temp(source, tmp_dir: Path):
+    # Copy a file-like object into a temp file while hashing it
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+            out.write(chunk)
+    return Path(tmp_path), digest.hexdigest(), size
+
+
+class MediaStore:
+    """Base class: metadata handling shared by all blob backends."""
+
+    def __init__(self, db, tmp_dir: Path):
+        self.db = db
+        self.tmp_dir = tmp_dir
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    async def get_info(self, media_id: str) -> Optional[dict]:
+        if not is_valid_media_id(media_id):
+            return None
+        return await self.db.media.find_one({"id": media_id}, {"_id": 0})
+
+    async def update_info(self, media_id: str, fields: dict):
+        await self.db.media.update_one({"id": media_id}, {"$set": fields})
+
+    async def _record(self, media_id: str, size: int, content_type: str) -> dict:
+        doc = {
+            "id": media_id,
+            "content_type": content_type or "application/octet-stream",
+            "size": size,
+            "backend": self.backend_name,
+            "created_at": datetime.now(timezone.utc)
+        }
+        await self.db.media.update_one({"id": media_id}, {"$setOnInsert": doc}, upsert=True)
+        return await self.get_info(media_id)
+
+    async def save(self, data: bytes, content_type: str) -> dict:
+        """Store raw bytes and return the media metadata document."""
+        media_id = hashlib.sha256(data).hexdigest()
+        existing = await self.get_info(media_id)
+        if existing:
+            return existing
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        return await self._commit(Path(tmp_path), media_id, len(data), content_type)
+
+    async def save_upload(self, upload, content_type: Optional[str] = None) -> dict:
+        """Store a FastAPI UploadFile without holding it in memory."""
+        tmp_path, media_id, size = await asyncio.to_thread(_spool_to_temp, upload.file, self.tmp_dir)
+        existing = await self.get_info(media_id)
+        if existing:
+            tmp_path.unlink(missing_ok=True)
+            return existing
+        return await self._commit(tmp_path, media_id, size, content_type or upload.content_type)
+
+    async def _commit(self, tmp_path: Path, media_id: str, size: int, content_type: str) -> dict:
+        try:
+            await self._write_blob(media_id, tmp_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return await self._record(media_id, size, content_type)
+
+    async def _write_blob(self, media_id: str, tmp_path: Path):
+        raise NotImplementedError
+
+    async def read(self, media_id: str) -> bytes:
+        raise NotImplementedError
+
+    def iter_range(self, media_id: str, start: int, end: int):
+        """Async generator over the inclusive byte range [start, end]."""
+        raise NotImplementedError
+
+
+class LocalMediaStore(MediaStore):
+    """Blobs stored on the local filesystem under MEDIA_ROOT/<aa>/<hash>."""
+
+    backend_name = "local"
+
+    def __init__(self, db, root: Path):
+        self.root = root
+        super().__init__(db, root / "tmp")
+
+    def path_for(self, media_id: str) -> Path:
+        return self.root / media_id[:2] / media_id
+
+    async def _write_blob(self, media_id: str, tmp_path: Path):
+        target = self.path_for(media_id)
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Same filesystem as tmp_dir, so this is an atomic rename
+        os.replace(tmp_path, target)
+
+    async def read(self, media_id: str) -> bytes:
+        return await asyncio.to_thread(self.path_for(media_id).read_bytes)
+
+    async def iter_range(self, media_id: str, start: int, end: int):
+        handle = await asyncio.to_thread(open, self.path_for(media_id), "rb")
+        try:
+            await asyncio.to_thread(handle.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(handle.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(handle.close)
+
+
+class GridFSMediaStore(MediaStore):
+    """Blobs stored in a GridFS bucket, using the content hash as file _id."""
+
+    backend_name = "gridfs"
+
+    def __init__(self, db, tmp_dir: Path, bucket_name: str = "media"):
+        super().__init__(db, tmp_dir)
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.bucket_name = bucket_name
+
+    async def _write_blob(self, media_id: str, tmp_path: Path):
+        if await self.db[f"{self.bucket_name}.files"].find_one({"_id": media_id}, {"_id": 1}):
+            return
+        with open(tmp_path, "rb") as source:
+            await self.bucket.upload_from_stream_with_id(media_id, media_id, source)
+
+    async def read(self, media_id: str) -> bytes:
+        stream = await self.bucket.open_download_stream(media_id)
+        return await stream.read()
+
+    async def iter_range(self, media_id: str, start: int, end: int):
+        stream = await self.bucket.open_download_stream(media_id)
+        try:
+            stream.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            stream.close()
+
+
+def create_media_store(db, root_dir: Path) -> MediaStore:
+    backend = os.environ.get('MEDIA_STORE', 'local').lower()
+    media_root = Path(os.environ.get('MEDIA_ROOT', str(root_dir / 'media')))
+    if backend == "gridfs":
+        logging.info("Using GridFS media store")
+        return GridFSMediaStore(db, media_root / "tmp")
+    logging.info(f"Using local media store at {media_root}")
+    return LocalMediaStore(db, media_root)
@@ -0,0 +1,156 @@
+"""Convert ISO 8601 string timestamps to native BSON dates.
+
+Usage (from the backend directory, with the same .env as the server):
+
+    python migrate_dates.py                   # migrate every collection
+    python migrate_dates.py --dry-run         # only report what would change
+    python migrate_dates.py --collection orders --pause 0.5
+
+Safe to run while the server is up: documents are scanned in `_id` order in
+bounded batches, only string-typed fields are rewritten, and each update
+re-checks that the field is still a string so a concurrent write is never
+overwritten. Running it again only picks up what is left. When a run finds
+nothing left to convert it records completion in the `migrations`
+collection; servers started afterwards stop matching the string form in
+their date queries (see timestamps.py).
+"""
+import os
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from timestamps import MIGRATION_ID, as_datetime
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# collection -> timestamp fields
+TARGETS = {
+    "users": ["created_at", "last_login"],
+    "password_reset_tokens": ["created_at"],
+    "orders": ["created_at", "completed_at", "shipped_at", "delivered_at"],
+    "blogs": ["created_at", "published_at"],
+    "coupons": ["created_at", "expires_at"],
+    "color_profiles": ["created_at"],
+    "media": ["created_at"],
+    "email_outbox": ["created_at", "next_attempt_at", "locked_until", "sent_at"],
+    "generation_jobs": ["created_at", "updated_at", "finished_at"],
+    "generation_cache": ["created_at"],
+    "migrations": ["updated_at"],
+}
+
+
+class DateMigration:
+    def __init__(self, db, batch_size=500, pause=0.0, dry_run=False):
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.stats = {"documents": 0, "fields": 0, "failed": 0}
+
+    def convert_document(self, doc, fields):
+        """($set, filter) for one document; the filter pins the original strings."""
+        update, guard = {}, {}
+        for field in fields:
+            value = doc.get(field)
+            if not isinstance(value, str):
+                continue
+            if value == "":
+                update[field] = None
+            else:
+                try:
+                    update[field] = as_datetime(value)
+                except ValueError:
+                    self.stats["failed"] += 1
+                    logging.error(f"Unparseable timestamp {field}={value!r} in document {doc['_id']}")
+                    continue
+            guard[field] = value
+            self.stats["fields"] += 1
+        return update, guard
+
+    async def migrate_collection(self, name, fields):
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        projection = {field: 1 for field in fields}
+        last_id = None
+        while True:
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            docs = await self.db[name].find(batch_query, projection).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                break
+            last_id = docs[-1]["_id"]
+
+            ops = []
+            for doc in docs:
+                update, guard = self.convert_document(doc, fields)
+                if update:
+                    self.stats["documents"] += 1
+                    ops.append(UpdateOne({"_id": doc["_id"], **guard}, {"$set": update}))
+            if ops and not self.dry_run:
+                result = await self.db[name].bulk_write(ops, ordered=False)
+                logging.info(f"[{name}] converted {result.modified_count} documents")
+            if self.pause:
+                await asyncio.sleep(self.pause)
+
+    async def remaining(self) -> int:
+        total = 0
+        for name, fields in TARGETS.items():
+            total += await self.db[name].count_documents({"$or": [{field: {"$type": "string"}} for field in fields]})
+        return total
+
+    async def run(self, collections=None):
+        started = time.monotonic()
+        for name, fields in TARGETS.items():
+            if collections and name not in collections:
+                continue
+            await self.migrate_collection(name, fields)
+        logging.info(
+            f"Date migration {'(dry run) ' if self.dry_run else ''}finished in {time.monotonic() - started:.1f}s: "
+            f"{self.stats['documents']} documents, {self.stats['fields']} fields, {self.stats['failed']} failures"
+        )
+
+        if not self.dry_run:
+            remaining = await self.remaining()
+            if remaining:
+                logging.info(f"{remaining} documents still hold string timestamps, not marking the migration complete")
+            else:
+                await self.db.migrations.update_one(
+                    {"id": MIGRATION_ID},
+                    {"$set": {"completed_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc)}},
+                    upsert=True
+                )
+                logging.info("Date migration complete, restart the server to drop the ISO string fallback")
+        return self.stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Convert ISO string timestamps to BSON dates")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per bulk_write batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--collection", action="append", choices=list(TARGETS), help="limit to a collection (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        migration = DateMigration(db, batch_size=args.batch_size, pause=args.pause, dry_run=args.dry_run)
+        await migration.run(collections=args.collection)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
@@ -0,0 +1,237 @@
+"""Extract embedded base64 `data:` URLs from Mongo documents into the media store.
+
+Usage (from the backend directory, with the same .env as the server):
+
+    python migrate_media.py                 # migrate, resuming from the last checkpoint
+    python migrate_media.py --dry-run       # only report what would change
+    python migrate_media.py --restart       # ignore checkpoints and scan from the start
+
+Documents are streamed with a cursor ordered by `_id`, only the media fields
+are projected, and updates are flushed with `bulk_write` in bounded batches.
+After every batch the last processed `_id` is saved in the `migrations`
+collection, so an interrupted run continues where it stopped.
+"""
+import os
+import re
+import time
+import base64
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from media_store import create_media_store, media_url
+from cache_version import VersionCounter
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+MIGRATION_ID = "extract_media"
+DATA_URL_RE = re.compile(r"^data:([^;,]*)(;[^,]*)?,", re.IGNORECASE)
+DATA_PREFIX = {"$regex": "^data:"}
+
+# collection -> (query, scalar fields, list fields)
+TARGETS = {
+    "blogs": (
+        {"$or": [{"image_url": DATA_PREFIX}, {"image_urls": DATA_PREFIX}, {"audio_url": DATA_PREFIX}]},
+        ["image_url", "audio_url"],
+        ["image_urls"]
+    ),
+    "products": (
+        {"image_url": DATA_PREFIX},
+        ["image_url"],
+        []
+    ),
+    "settings": (
+        {"$or": [
+            {"blog_gallery_images": DATA_PREFIX},
+            {"shop_gallery_images": DATA_PREFIX},
+            {"minigames_gallery_images": DATA_PREFIX},
+            {"blog_auto_gallery_images": DATA_PREFIX},
+            {"shop_auto_gallery_images": DATA_PREFIX}
+        ]},
+        [],
+        ["blog_gallery_images", "shop_gallery_images", "minigames_gallery_images",
+         "blog_auto_gallery_images", "shop_auto_gallery_images"]
+    ),
+}
+
+# Collections the running server caches or derives ETags from -> their version counter
+CACHE_VERSIONS = {
+    "blogs": "blogs_version",
+    "products": "catalog_version",
+    "settings": "settings_version",
+}
+
+
+def decode_data_url(value):
+    """Return (content_type, bytes) for a base64 data URL, or None."""
+    if not isinstance(value, str):
+        return None
+    match = DATA_URL_RE.match(value)
+    if not match or "base64" not in (match.group(2) or "").lower():
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=False)
+    except (ValueError, TypeError):
+        return None
+    return (match.group(1) or "application/octet-stream"), data
+
+
+class MediaMigration:
+    def __init__(self, db, media_store, batch_size=100, pause=0.0, dry_run=False):
+        self.db = db
+        self.media_store = media_store
+        self.batch_size = batch_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.stats = {"documents": 0, "fields": 0, "bytes": 0, "failed": 0}
+        self.failed_ids = {}
+
+    async def load_checkpoint(self, collection):
+        record = await self.db.migrations.find_one({"id": MIGRATION_ID}, {"_id": 0, "checkpoints": 1})
+        return (record or {}).get("checkpoints", {}).get(collection)
+
+    async def save_checkpoint(self, collection, last_id):
+        if self.dry_run:
+            return
+        await self.db.migrations.update_one(
+            {"id": MIGRATION_ID},
+            {"$set": {
+                f"checkpoints.{collection}": last_id,
+                "updated_at": datetime.now(timezone.utc)
+            }},
+            upsert=True
+        )
+
+    async def convert(self, value):
+        decoded = decode_data_url(value)
+        if not decoded:
+            return value
+        content_type, data = decoded
+        self.stats["fields"] += 1
+        self.stats["bytes"] += len(value)
+        if self.dry_run:
+            return value
+        media = await self.media_store.save(data, content_type)
+        return media_url(media["id"])
+
+    async def migrate_document(self, doc, scalar_fields, list_fields):
+        update = {}
+        for field in scalar_fields:
+            value = doc.get(field)
+            new_value = await self.convert(value)
+            if new_value != value:
+                update[field] = new_value
+        for field in list_fields:
+            values = doc.get(field)
+            if not isinstance(values, list):
+                continue
+            new_values = [await self.convert(v) for v in values]
+            if new_values != values:
+                update[field] = new_values
+        return update
+
+    async def migrate_collection(self, name, query, scalar_fields, list_fields, restart=False):
+        last_id = None if restart else await self.load_checkpoint(name)
+        if last_id is not None:
+            logging.info(f"[{name}] resuming after _id {last_id}")
+        # The checkpoint stops before the first failed document so a plain
+        # re-run retries it; documents after it that were already migrated no
+        # longer match the data: URL query and are skipped cheaply
+        checkpoint_id = last_id
+        failed = self.failed_ids.setdefault(name, [])
+
+        projection = {field: 1 for field in scalar_fields + list_fields}
+        while True:
+            # Re-open the cursor per batch so no server-side cursor is held
+            # open across slow media writes
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            cursor = self.db[name].find(batch_query, projection).sort("_id", 1).limit(self.batch_size)
+            ops = []
+            docs_seen = 0
+            async for doc in cursor:
+                docs_seen += 1
+                last_id = doc["_id"]
+                try:
+                    update = await self.migrate_document(doc, scalar_fields, list_fields)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    failed.append(doc["_id"])
+                    logging.error(f"[{name}] failed to migrate document {doc['_id']}: {str(e)}")
+                    continue
+                if not failed:
+                    checkpoint_id = doc["_id"]
+                if update:
+                    self.stats["documents"] += 1
+                    ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+
+            if ops and not self.dry_run:
+                result = await self.db[name].bulk_write(ops, ordered=False)
+                logging.info(f"[{name}] updated {result.modified_count} documents")
+                if result.modified_count and name in CACHE_VERSIONS:
+                    # Let running servers drop their cached copies
+                    await VersionCounter(self.db, CACHE_VERSIONS[name]).bump()
+
+            if docs_seen == 0:
+                break
+            await self.save_checkpoint(name, checkpoint_id)
+            logging.info(f"[{name}] checkpoint at _id {checkpoint_id} ({self.stats['fields']} fields so far)")
+            if self.pause:
+                await asyncio.sleep(self.pause)
+
+    async def run(self, collections=None, restart=False):
+        started = time.monotonic()
+        for name, (query, scalar_fields, list_fields) in TARGETS.items():
+            if collections and name not in collections:
+                continue
+            await self.migrate_collection(name, query, scalar_fields, list_fields, restart=restart)
+        logging.info(
+            f"Media migration {'(dry run) ' if self.dry_run else ''}finished in {time.monotonic() - started:.1f}s: "
+            f"{self.stats['documents']} documents, {self.stats['fields']} fields, "
+            f"{self.stats['bytes'] / (1024 * 1024):.1f} MB of data URLs, {self.stats['failed']} failures"
+        )
+        for name, ids in self.failed_ids.items():
+            if ids:
+                # A re-run resumes before the first of these and retries them
+                logging.error(f"[{name}] failed documents: {', '.join(str(_id) for _id in ids)}")
+        return self.stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Move embedded base64 media into the media store")
+    parser.add_argument("--batch-size", type=int, default=100, help="documents per bulk_write batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--collection", action="append", choices=list(TARGETS), help="limit to a collection (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+    try:
+        migration = MediaMigration(
+            db,
+            create_media_store(db, ROOT_DIR),
+            batch_size=args.batch_size,
+            pause=args.pause,
+            dry_run=args.dry_run
+        )
+        await migration.run(collections=args.collection, restart=args.restart)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""Minimal stand-in for the PayPal REST API, for local development and tests.
+
+Usage (from the backend directory):
+
+    uvicorn mock_paypal:app --port 8900
+    PAYPAL_API_BASE=http://localhost:8900 PAYPAL_CLIENT_ID=x PAYPAL_CLIENT_SECRET=y uvicorn server:app
+
+Implements the OAuth token, payment create and payment execute calls used by
+paypal_client.py. MOCK_PAYPAL_DELAY adds latency to every call (seconds) and
+MOCK_PAYPAL_TOKEN_TTL sets the token lifetime, to exercise deadlines and
+token refresh.
+"""
+import os
+import uuid
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+
+DELAY = float(os.environ.get('MOCK_PAYPAL_DELAY', 0))
+TOKEN_TTL = int(os.environ.get('MOCK_PAYPAL_TOKEN_TTL', 32400))
+payments = {}
+tokens = set()
+stats = {"tokens": 0, "creates": 0, "executes": 0}
+
+
+async def check_auth(request: Request):
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    header = request.headers.get("authorization", "")
+    return header.startswith("Bearer ") and header[7:] in tokens
+
+
+def unauthorized():
+    return JSONResponse(status_code=401, content={"error": "invalid_token", "error_description": "Token signature verification failed"})
+
+
+@app.post("/v1/oauth2/token")
+async def token():
+    if DELAY:
+        await asyncio.sleep(DELAY)
+    access_token = uuid.uuid4().hex
+    tokens.add(access_token)
+    stats["tokens"] += 1
+    return {"access_token": access_token, "token_type": "Bearer", "expires_in": TOKEN_TTL}
+
+
+@app.post("/v1/payments/payment")
+async def create_payment(request: Request):
+    if not await check_auth(request):
+        return unauthorized()
+    payment = await request.json()
+    payment_id = f"PAYID-{uuid.uuid4().hex[:20].upper()}"
+    payment.update({
+        "id": payment_id,
+        "state": "created",
+        "links": [
+            {"rel": "approval_url", "method": "REDIRECT",
+             "href": f"{payment['redirect_urls']['return_url']}?paymentId={payment_id}&PayerID=MOCKPAYER"}
+        ]
+    })
+    payments[payment_id] = payment
+    stats["creates"] += 1
+    return payment
+
+
+@app.post("/v1/payments/payment/{payment_id}/execute")
+async def execute_payment(payment_id: str, request: Request):
+    if not await check_auth(request):
+        return unauthorized()
+    payment = payments.get(payment_id)
+    if not payment:
+        return JSONResponse(status_code=404, content={"name": "INVALID_RESOURCE_ID", "message": "Requested resource ID was not found."})
+    body = await request.json()
+    payment.update({"state": "approved", "payer": {"payer_info": {"payer_id": body.get("payer_id")}}})
+    stats["executes"] += 1
+    return payment
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
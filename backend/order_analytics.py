@@ -0,0 +1,275 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+from pymongo import UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from order_stats import REVENUE_STATUSES, cents
+from timestamps import as_datetime
+
+# Pre-aggregated sales analytics.
+# Sold orders are rolled up into hourly and daily buckets in the
+# `analytics_rollups` collection: revenue, order count, items sold per
+# product and discount per coupon code. Like the order counters (see
+# order_stats.py), the endpoints that move an order in or out of a sold
+# status pass its state before and after the write to record(), which
+# applies the difference to the affected buckets with $inc. The analytics
+# endpoint then reads a few dozen bucket documents instead of scanning
+# orders. rebuild() recomputes every bucket from the orders; it runs once in
+# the background to backfill existing orders (one worker claims it) and can
+# be triggered again to repair drift. Every $inc also bumps the bucket's
+# `seq`, and rebuild() only replaces a bucket whose seq is unchanged since
+# before it scanned, so concurrent order writes are never overwritten.
+
+MIGRATION_ID = "analytics_rollups"
+# A backfill claim older than this is assumed dead (worker stopped mid-run)
+BACKFILL_CLAIM_TIMEOUT = timedelta(minutes=30)
+REBUILD_ATTEMPTS = 3
+DUPLICATE_KEY = 11000
+GRANULARITIES = ("hour", "day")
+# Order fields the rollups depend on
+ROLLUP_PROJECTION = {
+    "_id": 0, "status": 1, "total": 1, "items": 1, "coupon_code": 1, "discount_amount": 1,
+    "completed_at": 1, "created_at": 1
+}
+
+
+def _field(key) -> str:
+    # Product ids and coupon codes become field names; keep them path-safe
+    return str(key).replace(".", "_").replace("$", "_") or "_"
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    moment = as_datetime(moment).astimezone(timezone.utc)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def sold_at(order: dict) -> Optional[datetime]:
+    """When an order counts as sold: payment time, else creation (manual status changes)."""
+    return as_datetime(order.get("completed_at") or order.get("created_at"))
+
+
+def contribution(order: Optional[dict]) -> dict:
+    """What a single order adds to each bucket counter, keyed by (granularity, bucket)."""
+    if not order or order.get("status") not in REVENUE_STATUSES:
+        return {}
+    moment = sold_at(order)
+    if moment is None:
+        return {}
+    counters = {"orders": 1, "revenue_cents": cents(order.get("total"))}
+    for item in order.get("items") or []:
+        key = f"items.{_field(item.get('product_id'))}"
+        counters[key] = counters.get(key, 0) + int(item.get("quantity") or 0)
+    discount = cents(order.get("discount_amount"))
+    counters["discount_cents"] = discount
+    if order.get("coupon_code"):
+        code = _field(order["coupon_code"].upper())
+        counters[f"coupons.{code}.orders"] = 1
+        counters[f"coupons.{code}.discount_cents"] = discount
+    return {(granularity, bucket_start(moment, granularity)): counters for granularity in GRANULARITIES}
+
+
+def delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Per-bucket counter changes for an order going from `before` to `after`."""
+    changes = {key: dict(counters) for key, counters in contribution(after).items()}
+    for key, counters in contribution(before).items():
+        bucket = changes.setdefault(key, {})
+        for field, value in counters.items():
+            bucket[field] = bucket.get(field, 0) - value
+    changes = {key: {field: value for field, value in counters.items() if value} for key, counters in changes.items()}
+    return {key: counters for key, counters in changes.items() if counters}
+
+
+def _add(target: dict, path: str, value: int):
+    # Applies a dotted counter path to a nested dict (rebuild's in-memory $inc)
+    *parents, leaf = path.split(".")
+    for part in parents:
+        target = target.setdefault(part, {})
+    target[leaf] = target.get(leaf, 0) + value
+
+
+def summarize(buckets: list, granularity: str, start: datetime, end: datetime) -> dict:
+    totals = {"orders": 0, "revenue_cents": 0, "discount_cents": 0}
+    items, coupons, series = {}, {}, []
+    for bucket in buckets:
+        for field in totals:
+            totals[field] += bucket.get(field, 0)
+        for product_id, quantity in (bucket.get("items") or {}).items():
+            items[product_id] = items.get(product_id, 0) + quantity
+        for code, usage in (bucket.get("coupons") or {}).items():
+            entry = coupons.setdefault(code, {"orders": 0, "discount_cents": 0})
+            entry["orders"] += usage.get("orders", 0)
+            entry["discount_cents"] += usage.get("discount_cents", 0)
+        if bucket.get("orders"):
+            series.append({
+                "bucket": bucket["bucket"],
+                "orders": bucket["orders"],
+                "revenue": bucket.get("revenue_cents", 0) / 100
+            })
+    return {
+        "from": start,
+        "to": end,
+        "granularity": granularity,
+        "totals": {
+            "orders": totals["orders"],
+            "revenue": totals["revenue_cents"] / 100,
+            "discount": totals["discount_cents"] / 100,
+            "items_sold": sum(items.values()),
+            "average_order_value": round(totals["revenue_cents"] / totals["orders"] / 100, 2) if totals["orders"] else 0.0
+        },
+        "series": series,
+        "products": sorted(
+            ({"product_id": product_id, "quantity": quantity} for product_id, quantity in items.items() if quantity),
+            key=lambda entry: entry["quantity"], reverse=True
+        ),
+        "coupons": sorted(
+            ({"code": code, "orders": usage["orders"], "discount": usage["discount_cents"] / 100}
+             for code, usage in coupons.items() if usage["orders"]),
+            key=lambda entry: entry["orders"], reverse=True
+        )
+    }
+
+
+class OrderAnalytics:
+    def __init__(self, db):
+        self.db = db
+        self._task = None
+
+    async def record(self, before: Optional[dict], after: Optional[dict]):
+        """Apply the bucket changes of one order write."""
+        changes = delta(before, after)
+        if not changes:
+            return
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.analytics_rollups.bulk_write([
+                UpdateOne(
+                    {"granularity": granularity, "bucket": bucket},
+                    {"$inc": {**counters, "seq": 1}, "$set": {"updated_at": now}},
+                    upsert=True
+                )
+                for (granularity, bucket), counters in changes.items()
+            ], ordered=False)
+        except Exception as e:
+            # The order write already happened; a rebuild repairs the buckets
+            logging.error(f"Failed to update analytics rollups: {str(e)}")
+
+    async def query(self, start: datetime, end: datetime, granularity: str = "day") -> dict:
+        """Totals, time series, products and coupons for sales in [start, end)."""
+        buckets = await self.db.analytics_rollups.find(
+            {"granularity": granularity, "bucket": {"$gte": bucket_start(start, granularity), "$lt": end}},
+            {"_id": 0, "updated_at": 0}
+        ).sort("bucket", 1).to_list(None)
+        return summarize(buckets, granularity, start, end)
+
+    async def _compute(self) -> dict:
+        buckets = {}
+        async for order in self.db.orders.find({"status": {"$in": list(REVENUE_STATUSES)}}, ROLLUP_PROJECTION):
+            for key, counters in contribution(order).items():
+                bucket = buckets.setdefault(key, {})
+                for path, value in counters.items():
+                    _add(bucket, path, value)
+        return buckets
+
+    async def _seqs(self) -> dict:
+        seqs = {}
+        async for doc in self.db.analytics_rollups.find({}, {"_id": 0, "granularity": 1, "bucket": 1, "seq": 1}):
+            seqs[(doc["granularity"], as_datetime(doc["bucket"]))] = doc.get("seq", 0)
+        return seqs
+
+    async def rebuild(self) -> int:
+        """Recompute every bucket from the orders; returns the number of buckets with sales."""
+        pending = None
+        for _ in range(REBUILD_ATTEMPTS):
+            # Read before scanning: a record() landing after this changes seq
+            seqs = await self._seqs()
+            buckets = await self._compute()
+            keys = list((set(buckets) | set(seqs)) if pending is None else pending)
+            now = datetime.now(timezone.utc)
+            requests = []
+            for granularity, bucket in keys:
+                key = (granularity, bucket)
+                # Buckets that no longer have any sold order are zeroed
+                counters = buckets.get(key, {"orders": 0, "revenue_cents": 0, "discount_cents": 0})
+                # Only replace a bucket no record() touched since the snapshot.
+                # One that changed (or was created meanwhile) fails the filter,
+                # and the upsert then hits the unique index, marking it as raced
+                if key not in seqs:
+                    seq_filter = {"$exists": False}
+                elif seqs[key]:
+                    seq_filter = seqs[key]
+                else:
+                    # Buckets written before seq existed have none
+                    seq_filter = {"$in": [0, None]}
+                requests.append(ReplaceOne(
+                    {"granularity": granularity, "bucket": bucket, "seq": seq_filter},
+                    {"granularity": granularity, "bucket": bucket, **counters, "seq": seqs.get(key, 0), "updated_at": now},
+                    upsert=True
+                ))
+
+            raced = set()
+            if requests:
+                try:
+                    await self.db.analytics_rollups.bulk_write(requests, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if any(error.get("code") != DUPLICATE_KEY for error in errors):
+                        raise
+                    raced = {keys[error["index"]] for error in errors}
+            if not raced:
+                count = sum(1 for counters in buckets.values() if counters.get("orders"))
+                logging.info(f"Analytics rollups rebuilt: {count} buckets")
+                return count
+            # Recompute only the buckets that order writes touched meanwhile
+            pending = raced
+        logging.warning(f"Analytics rebuild kept racing order writes on {len(pending)} buckets; rebuild again to repair")
+        return sum(1 for counters in buckets.values() if counters.get("orders"))
+
+    async def ensure_backfilled(self):
+        """Build the rollups for orders placed before they were maintained (once, by one worker)."""
+        now = datetime.now(timezone.utc)
+        try:
+            # Atomic claim: other workers fail the filter and hit the unique id
+            await self.db.migrations.update_one(
+                {
+                    "id": MIGRATION_ID,
+                    "completed_at": None,
+                    "$or": [{"claimed_at": None}, {"claimed_at": {"$lt": now - BACKFILL_CLAIM_TIMEOUT}}]
+                },
+                {"$set": {"claimed_at": now}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return
+        buckets = await self.rebuild()
+        await self.db.migrations.update_one(
+            {"id": MIGRATION_ID},
+            {"$set": {"completed_at": datetime.now(timezone.utc), "buckets": buckets}}
+        )
+
+    async def _backfill(self):
+        try:
+            await self.ensure_backfilled()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The claim expires, so a later start retries
+            logging.error(f"Analytics rollup backfill failed: {str(e)}")
+
+    def start(self):
+        """Backfill in the background so startup doesn't wait for a scan of all orders."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._backfill())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
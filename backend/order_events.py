@@ -0,0 +1,184 @@
+import asyncio
+import logging
+from typing import Optional, AsyncIterator
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from json_response import dumps
+from order_stats import STATS_ID, summarize
+
+# Live order events for the admin UI.
+# Order changes are pushed to subscribers of GET /api/orders/events as
+# Server-Sent Events instead of being found by polling. When MongoDB runs
+# as a replica set the events come from a change stream on `orders`, so
+# every worker sees every change and writes made outside the API too.
+# Without change streams (standalone mongod) the endpoints publish their own
+# writes in-process via emit(); that covers the single-worker deployment.
+# The unviewed count comes from the maintained counters (see order_stats.py).
+# A change stream can deliver an order change before the writer has updated
+# the counters, so it also follows the counters document and sends an
+# `order_stats` event whenever it moves.
+
+# Order fields sent along with created/paid events (enough for the order list)
+EVENT_ORDER_FIELDS = (
+    "id", "items", "total", "customer_email", "coupon_code", "discount_amount", "status",
+    "viewed", "created_at", "completed_at", "shipped_at", "delivered_at",
+    "tracking_number", "shipping_carrier", "tracking_url"
+)
+HEARTBEAT_SECONDS = 20
+RETRY_SECONDS = 5
+# ChangeStreamFatalError, ChangeStreamHistoryLost
+CHANGE_STREAM_HISTORY_LOST = (280, 286)
+
+
+def sse_message(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+def event_from_change(change: dict) -> Optional[tuple]:
+    """(event name, order id, order) for a change stream document."""
+    operation = change.get("operationType")
+    order = change.get("fullDocument")
+    if operation == "insert":
+        return "order_created", order.get("id"), order
+    if operation in ("update", "replace"):
+        if not order:
+            # Deleted again before the lookup ran
+            return None
+        updated = (change.get("updateDescription") or {}).get("updatedFields") or order
+        if "status" in updated:
+            return ("order_paid" if updated["status"] == "paid" else "order_status_changed"), order.get("id"), order
+        if "viewed" in updated:
+            return "order_viewed", order.get("id"), order
+        return "order_updated", order.get("id"), order
+    if operation == "delete":
+        # Only the _id is known without pre-images; clients refresh instead
+        return "order_deleted", None, None
+    return None
+
+
+class OrderEvents:
+    def __init__(self, db, stats):
+        self.db = db
+        self.stats = stats
+        # "local" until a change stream is open, then "change_stream"
+        self.mode = "local"
+        self._subscribers = set()
+        self._resume_token = None
+        self._task = None
+
+    async def _publish(self, event: str, order_id: Optional[str], order: Optional[dict]):
+        if not self._subscribers:
+            return
+        data = {
+            "order_id": order_id,
+            "status": order.get("status") if order else None,
+            "viewed": bool(order.get("viewed")) if order else None,
+            "unviewed_count": await self._unviewed_count()
+        }
+        if order and event in ("order_created", "order_paid"):
+            data["order"] = {field: order.get(field) for field in EVENT_ORDER_FIELDS if field in order}
+        message = sse_message(event, data)
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    async def _unviewed_count(self) -> int:
+        return await self.stats.unviewed()
+
+    def _publish_stats(self, doc: dict):
+        if not self._subscribers:
+            return
+        stats = summarize(doc)
+        message = sse_message("order_stats", {"unviewed_count": stats["unviewed"], "stats": stats})
+        for queue in self._subscribers:
+            queue.put_nowait(message)
+
+    async def emit(self, event: str, order_id: str, order: Optional[dict] = None):
+        """Publish a write made by this process; a no-op while a change stream delivers events."""
+        if self.mode != "local" or not self._subscribers:
+            return
+        try:
+            if order is None and event != "order_deleted":
+                order = await self.db.orders.find_one({"id": order_id}, {"_id": 0})
+            await self._publish(event, order_id, order)
+        except Exception as e:
+            logging.warning(f"Failed to publish order event {event} for {order_id}: {str(e)}")
+
+    async def watch(self):
+        while True:
+            try:
+                async with self.db.watch(
+                    [{"$match": {"$or": [
+                        {"ns.coll": "orders"},
+                        {"ns.coll": "stats", "fullDocument.id": STATS_ID}
+                    ]}}],
+                    full_document="updateLookup",
+                    resume_after=self._resume_token,
+                    max_await_time_ms=1000
+                ) as stream:
+                    while True:
+                        # The first call opens the stream, so errors surface here
+                        change = await stream.try_next()
+                        if self.mode != "change_stream":
+                            self.mode = "change_stream"
+                            logging.info("Order events: following the orders change stream")
+                        self._resume_token = stream.resume_token
+                        if change is not None and change["ns"]["coll"] == "stats":
+                            self._publish_stats(change["fullDocument"])
+                        elif change is not None:
+                            event = event_from_change(change)
+                            if event:
+                                await self._publish(*event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAM_HISTORY_LOST:
+                    # Resume token fell off the oplog: start over from now
+                    logging.warning(f"Order change stream could not resume, restarting: {str(e)}")
+                    self._resume_token = None
+                    continue
+                # Standalone server: change streams need a replica set
+                self.mode = "local"
+                logging.info(f"Order events: change streams unavailable, publishing in-process ({str(e)})")
+                return
+            except PyMongoError as e:
+                # Keep the mode: events resume from the token once reconnected
+                logging.warning(f"Order change stream interrupted, retrying in {RETRY_SECONDS}s: {str(e)}")
+            except Exception as e:
+                logging.error(f"Order change stream error, retrying in {RETRY_SECONDS}s: {str(e)}")
+            await asyncio.sleep(RETRY_SECONDS)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """SSE stream: a snapshot with the unviewed count, then live events."""
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            count = await self._unviewed_count()
+            yield sse_message("snapshot", {"unviewed_count": count, "mode": self.mode})
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self._subscribers.discard(queue)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.watch())
+
+    async def stop(self):
+        for queue in self._subscribers:
+            queue.put_nowait(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
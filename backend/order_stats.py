@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+# Maintained order counters for the admin dashboard.
+# One document in the `stats` collection holds the number of orders, the
+# unviewed badge count, orders per status and the revenue to date. Every
+# endpoint that changes an order passes the order as it was before and after
+# the write to record(), which applies the difference with a single $inc, so
+# reading a badge is one lookup by id instead of a count over all orders.
+# A background job recomputes the counters from the orders collection and
+# repairs any drift (e.g. a process dying between the two writes).
+
+STATS_ID = "orders"
+# Same definition the badge always had; older orders have no viewed flag
+UNVIEWED_QUERY = {"viewed": {"$ne": True}, "status": "completed"}
+# Statuses whose order total counts as revenue
+REVENUE_STATUSES = ("paid", "packed", "shipped", "in_transit", "delivered", "completed")
+# Order fields the counters depend on
+STATS_PROJECTION = {"_id": 0, "status": 1, "viewed": 1, "total": 1}
+RECONCILE_INTERVAL_SECONDS = 60 * 60
+RECONCILE_ATTEMPTS = 3
+
+
+def cents(amount) -> int:
+    # Revenue is summed in integer cents so repeated $inc don't accumulate float error
+    return int(round(float(amount or 0) * 100))
+
+
+def contribution(order: Optional[dict]) -> dict:
+    """What a single order adds to each counter."""
+    if not order:
+        return {}
+    status = order.get("status") or "unknown"
+    counters = {"orders": 1, f"by_status.{status}": 1}
+    if status == "completed" and order.get("viewed") is not True:
+        counters["unviewed"] = 1
+    if status in REVENUE_STATUSES:
+        counters["revenue_cents"] = cents(order.get("total"))
+    return counters
+
+
+def delta(before: Optional[dict], after: Optional[dict]) -> dict:
+    """Counter changes for an order going from `before` to `after` (None = absent)."""
+    changes = contribution(after)
+    for key, value in contribution(before).items():
+        changes[key] = changes.get(key, 0) - value
+    return {key: value for key, value in changes.items() if value}
+
+
+def summarize(doc: Optional[dict]) -> dict:
+    doc = doc or {}
+    return {
+        "orders": doc.get("orders", 0),
+        "unviewed": max(doc.get("unviewed", 0), 0),
+        "by_status": {status: count for status, count in (doc.get("by_status") or {}).items() if count},
+        "revenue": doc.get("revenue_cents", 0) / 100,
+        "updated_at": doc.get("updated_at"),
+        "reconciled_at": doc.get("reconciled_at")
+    }
+
+
+class OrderStats:
+    def __init__(self, db):
+        self.db = db
+        self._task = None
+        self._first_count = asyncio.Lock()
+
+    async def record(self, before: Optional[dict], after: Optional[dict]):
+        """Apply the counter changes of one order write."""
+        changes = delta(before, after)
+        if not changes:
+            return
+        try:
+            await self.db.stats.update_one(
+                {"id": STATS_ID},
+                {"$inc": {**changes, "seq": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except Exception as e:
+            # The order write already happened; the next reconciliation fixes the counters
+            logging.error(f"Failed to update order stats {changes}: {str(e)}")
+
+    async def read(self) -> dict:
+        doc = await self.db.stats.find_one({"id": STATS_ID}, {"_id": 0})
+        if doc is None:
+            # Very first use, before the background job ran: count once per worker.
+            # A document that so far was only incremented is returned as is;
+            # repairing it is the background job's work, not every reader's
+            async with self._first_count:
+                doc = await self.db.stats.find_one({"id": STATS_ID}, {"_id": 0})
+                if doc is None:
+                    await self.reconcile()
+                    doc = await self.db.stats.find_one({"id": STATS_ID}, {"_id": 0})
+        return summarize(doc)
+
+    async def unviewed(self) -> int:
+        return (await self.read())["unviewed"]
+
+    async def _recount(self) -> dict:
+        totals = {"orders": 0, "unviewed": 0, "by_status": {}, "revenue_cents": 0}
+        async for order in self.db.orders.find({}, STATS_PROJECTION):
+            for key, value in contribution(order).items():
+                if key.startswith("by_status."):
+                    status = key.split(".", 1)[1]
+                    totals["by_status"][status] = totals["by_status"].get(status, 0) + value
+                else:
+                    totals[key] += value
+        return totals
+
+    async def reconcile(self) -> bool:
+        """Recompute the counters from the orders; False if writes kept racing it."""
+        for _ in range(RECONCILE_ATTEMPTS):
+            current = await self.db.stats.find_one({"id": STATS_ID}, {"_id": 0}) or {}
+            seq = current.get("seq")
+            totals = await self._recount()
+
+            stored = {
+                "orders": current.get("orders", 0),
+                "unviewed": current.get("unviewed", 0),
+                "by_status": {status: count for status, count in (current.get("by_status") or {}).items() if count},
+                "revenue_cents": current.get("revenue_cents", 0)
+            }
+            drift = {key: (stored[key], value) for key, value in totals.items() if stored[key] != value}
+
+            # Only overwrite if no record() landed while counting (seq unchanged)
+            try:
+                result = await self.db.stats.update_one(
+                    {"id": STATS_ID, "seq": seq if seq is not None else {"$exists": False}},
+                    {"$set": {**totals, "reconciled_at": datetime.now(timezone.utc)}},
+                    upsert=not current
+                )
+            except DuplicateKeyError:
+                # Created by a concurrent record() in the meantime
+                continue
+            if result.matched_count or result.upserted_id is not None:
+                if drift and current.get("reconciled_at") is not None:
+                    logging.warning(f"Order stats drifted, repaired (stored, actual): {drift}")
+                return True
+        logging.warning("Order stats reconciliation kept racing order writes; retrying next run")
+        return False
+
+    async def run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Order stats reconciliation error: {str(e)}")
+            await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,58 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+# Password hashing off the event loop.
+# bcrypt is deliberately slow (~100-300 ms per call). Run inline in an async
+# handler it stalls every other request on the worker, so hashing and
+# verification go through a small dedicated thread pool instead. The bcrypt
+# C extension releases the GIL, so the event loop keeps serving requests
+# while a hash is computed. The pool size caps how many hashes run at once;
+# everything else waits in the executor queue, which is tracked as a metric.
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext = pwd_context, max_workers=None):
+        self.context = context
+        self.max_workers = max_workers or int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        self._in_flight = 0
+        self.stats = {"completed": 0, "max_queue_depth": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        """Calls waiting for a free worker (not counting the ones running)."""
+        return max(self._in_flight - self.max_workers, 0)
+
+    async def _run(self, func, *args):
+        self._in_flight += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue_depth)
+        if self.queue_depth:
+            logging.debug(f"Password hashing queue depth {self.queue_depth}")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._in_flight -= 1
+            self.stats["completed"] += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(self.context.verify, password, hashed_password)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "running": min(self._in_flight, self.max_workers),
+            "queue_depth": self.queue_depth,
+            **self.stats
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
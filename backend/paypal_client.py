@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+# Async PayPal REST client.
+# One shared httpx.AsyncClient keeps connections to PayPal alive between
+# calls, the OAuth access token is cached until shortly before it expires,
+# and every call runs under an overall deadline so a slow PayPal response
+# fails the request instead of hanging it.
+
+PAYPAL_API_BASES = {
+    "sandbox": "https://api-m.sandbox.paypal.com",
+    "live": "https://api-m.paypal.com",
+}
+# Refresh the token this long before PayPal says it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 5 * 60
+
+
+class PayPalError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None, details=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class PayPalTimeout(PayPalError):
+    pass
+
+
+class PayPalClient:
+    def __init__(self, client_id: str, client_secret: str, base_url: str, deadline: float = 20.0,
+                 connect_timeout: float = 5.0, max_connections: int = 10):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip("/")
+        self.deadline = deadline
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self._http = None
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.client_id and self.client_secret)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.deadline, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            )
+        return self._http
+
+    async def _access_token(self, force_refresh: bool = False) -> str:
+        if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        async with self._token_lock:
+            # Another request may have refreshed it while we waited
+            if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            response = await self.http.post(
+                "/v1/oauth2/token",
+                data={"grant_type": "client_credentials"},
+                auth=(self.client_id, self.client_secret),
+                headers={"Accept": "application/json"}
+            )
+            if response.status_code != 200:
+                raise PayPalError("PayPal authentication failed", response.status_code, _error_body(response))
+            body = response.json()
+            self._token = body["access_token"]
+            lifetime = max(int(body.get("expires_in", 0)) - TOKEN_REFRESH_MARGIN_SECONDS, 0)
+            self._token_expires_at = time.monotonic() + lifetime
+            logging.info(f"PayPal access token refreshed (valid for {body.get('expires_in')}s)")
+            return self._token
+
+    async def _call(self, method: str, path: str, payload: Optional[dict] = None) -> dict:
+        token = await self._access_token()
+        response = await self.http.request(method, path, json=payload, headers={"Authorization": f"Bearer {token}"})
+        if response.status_code == 401:
+            # Token revoked or expired early: fetch a new one and retry once
+            token = await self._access_token(force_refresh=True)
+            response = await self.http.request(method, path, json=payload, headers={"Authorization": f"Bearer {token}"})
+        if response.status_code >= 400:
+            details = _error_body(response)
+            message = details.get("message") if isinstance(details, dict) else None
+            raise PayPalError(message or f"PayPal request failed with status {response.status_code}", response.status_code, details)
+        return response.json()
+
+    async def request(self, method: str, path: str, payload: Optional[dict] = None,
+                      deadline: Optional[float] = None) -> dict:
+        """Call the PayPal API; token refresh and retry share one deadline."""
+        if not self.configured:
+            raise PayPalError("PayPal not configured")
+        deadline = deadline or self.deadline
+        try:
+            return await asyncio.wait_for(self._call(method, path, payload), timeout=deadline)
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            raise PayPalTimeout(f"PayPal did not respond within {deadline:g}s")
+        except httpx.HTTPError as e:
+            raise PayPalError(f"PayPal request failed: {str(e)}")
+
+    async def create_payment(self, payment: dict, deadline: Optional[float] = None) -> dict:
+        return await self.request("POST", "/v1/payments/payment", payment, deadline=deadline)
+
+    async def execute_payment(self, payment_id: str, payer_id: str, deadline: Optional[float] = None) -> dict:
+        return await self.request(
+            "POST", f"/v1/payments/payment/{payment_id}/execute", {"payer_id": payer_id}, deadline=deadline
+        )
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def _error_body(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def approval_url(payment: dict) -> Optional[str]:
+    for link in payment.get("links", []):
+        if link.get("rel") == "approval_url":
+            return link.get("href")
+    return None
+
+
+def create_paypal_client() -> PayPalClient:
+    mode = os.environ.get('PAYPAL_MODE', 'sandbox').lower()
+    # PAYPAL_API_BASE points the client at a mock server in development
+    base_url = os.environ.get('PAYPAL_API_BASE') or PAYPAL_API_BASES.get(mode, PAYPAL_API_BASES["sandbox"])
+    return PayPalClient(
+        os.environ.get('PAYPAL_CLIENT_ID', ''),
+        os.environ.get('PAYPAL_CLIENT_SECRET', ''),
+        base_url,
+        deadline=float(os.environ.get('PAYPAL_TIMEOUT', 20))
+    )
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from media_store import media_url
+
+# Pexels image search with a shared client and an on-disk cache.
+# One pooled httpx client serves every search and download. Search results
+# are cached as JSON files keyed by the query parameters, and each downloaded
+# photo is remembered as photo id -> media id; the bytes themselves already
+# live in the content-addressed media store, so a repeated search for a
+# popular keyword makes no outbound request at all.
+
+PEXELS_API_BASE = "https://api.pexels.com"
+SEARCH_TTL_SECONDS = 24 * 60 * 60
+
+
+class PexelsError(Exception):
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _read_json(path: Path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+class PexelsClient:
+    def __init__(self, api_key: Optional[str], media_store, store_image, cache_dir: Path,
+                 concurrency: int = 4, search_ttl: int = SEARCH_TTL_SECONDS):
+        self.api_key = api_key
+        self.media_store = media_store
+        self.store_image = store_image
+        self.cache_dir = cache_dir
+        self.search_ttl = search_ttl
+        self._downloads = asyncio.Semaphore(concurrency)
+        self._http = None
+        self.stats = {"searches": 0, "search_hits": 0, "downloads": 0, "download_hits": 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10)
+            )
+        return self._http
+
+    def _search_path(self, params: dict) -> Path:
+        key = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+        return self.cache_dir / "search" / f"{key}.json"
+
+    def _photo_path(self, photo_id, size: str) -> Path:
+        return self.cache_dir / "photos" / f"{photo_id}-{size}"
+
+    async def search(self, query: str, per_page: int, orientation: Optional[str] = None) -> list:
+        """Photos for a query, from the disk cache if fresh."""
+        if not self.configured:
+            raise PexelsError("Pexels API key not configured", 500)
+        params = {"query": query.strip().lower(), "per_page": per_page}
+        if orientation:
+            params["orientation"] = orientation
+
+        path = self._search_path(params)
+        cached = await asyncio.to_thread(_read_json, path)
+        if cached and time.time() - cached.get("fetched_at", 0) < self.search_ttl:
+            self.stats["search_hits"] += 1
+            return cached["photos"]
+
+        response = await self.http.get(
+            f"{PEXELS_API_BASE}/v1/search",
+            headers={"Authorization": self.api_key},
+            params=params
+        )
+        self.stats["searches"] += 1
+        if response.status_code != 200:
+            raise PexelsError("Failed to fetch from Pexels", response.status_code)
+        # Only keep what we use
+        photos = [{"id": photo["id"], "src": photo.get("src", {})} for photo in response.json().get("photos", [])]
+        await asyncio.to_thread(_write_atomic, path, json.dumps({"fetched_at": time.time(), "photos": photos}))
+        return photos
+
+    async def download(self, photo: dict, size: str = "medium") -> Optional[str]:
+        """Store a photo in the media store (once per photo id); returns its media URL."""
+        image_url = photo.get("src", {}).get(size)
+        if not image_url:
+            return None
+        path = self._photo_path(photo["id"], size)
+        media_id = await asyncio.to_thread(lambda: path.read_text().strip() if path.exists() else None)
+        if media_id and await self.media_store.get_info(media_id):
+            self.stats["download_hits"] += 1
+            return media_url(media_id)
+
+        async with self._downloads:
+            response = await self.http.get(image_url)
+        self.stats["downloads"] += 1
+        if response.status_code != 200:
+            logging.warning(f"Pexels image {photo['id']} download failed with status {response.status_code}")
+            return None
+        url = await self.store_image(response.content)
+        await asyncio.to_thread(_write_atomic, path, url.rsplit("/", 1)[-1])
+        return url
+
+    async def fetch_images(self, query: str, count: int, orientation: Optional[str] = None,
+                           size: str = "medium") -> list:
+        """Search and download up to `count` photos concurrently; failed ones are skipped."""
+        photos = (await self.search(query, count, orientation))[:count]
+        results = await asyncio.gather(*(self.download(photo, size) for photo in photos), return_exceptions=True)
+        urls = []
+        for photo, result in zip(photos, results):
+            if isinstance(result, Exception):
+                logging.error(f"Error downloading image {photo['id']}: {str(result)}")
+            elif result:
+                urls.append(result)
+        return urls
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -1,8 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import PyMongoError
 import os
 import logging
 from pathlib import Path
@@ -11,18 +14,30 @@ from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
 import asyncio
-import google.generativeai as genai
-import base64
+import time
 import re
-import paypalrestsdk
-import httpx
-import aiosmtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from passlib.context import CryptContext
+import base64
+import json
 from jose import JWTError, jwt
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
+from media_store import create_media_store, media_url, parse_range_header, MEDIA_URL_PREFIX
+from image_derivatives import ImageDerivativePipeline, build_srcset
+from email_outbox import EmailOutbox
+from email_templates import EmailTemplates
+from password_hashing import PasswordHasher
+from google_auth import GoogleKeyCache
+from blog_generation import BlogGenerationJobs
+from generation_cache import GenerationCache
+from pexels_client import PexelsClient, PexelsError
+from catalog import ProductCatalog
+from settings_cache import SettingsCache
+from cache_version import VersionCounter
+from http_cache import make_etag, validator_headers, is_not_modified
+from json_response import FastJSONResponse
+from timestamps import as_datetime, range_query, keyset_before, load_migration_state
+from order_events import OrderEvents
+from order_stats import OrderStats, STATS_PROJECTION
+from order_analytics import OrderAnalytics, ROLLUP_PROJECTION
+from paypal_client import create_paypal_client, approval_url, PayPalError, PayPalTimeout
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -32,14 +47,14 @@ SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-product
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher()
 security = HTTPBearer()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -73,242 +88,244 @@ def generate_tracking_url(carrier: str, tracking_number: str) -> str:
     }
     return carrier_urls.get(carrier, f"https://www.google.com/search?q={carrier}+tracking+{tracking_number}")
 
-# Email notification function
+# Email templates are compiled once at import time
+email_templates = EmailTemplates()
+
+CUSTOMER_STATUS_SUBJECTS = {
+    'paid': "✅ Bestellbestätigung - apebrain.cloud",
+    'shipped': "📦 Ihre Bestellung wurde versendet - apebrain.cloud",
+    'delivered': "🏠 Ihre Bestellung wurde zugestellt - apebrain.cloud",
+}
+
+# Email notification function (queued, sent by the outbox worker)
 async def send_order_notification(order_data):
     try:
-        smtp_host = os.environ.get('SMTP_HOST')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
         notification_email = os.environ.get('NOTIFICATION_EMAIL')
-        
-        if not all([smtp_host, smtp_user, smtp_password, notification_email]):
+        if not notification_email:
             logging.warning("Email configuration incomplete, skipping notification")
             return
         
-        # Create email
-        message = MIMEMultipart()
-        message['From'] = smtp_user
-        message['To'] = notification_email
-        message['Subject'] = "🛍️ Neue Bestellung - apebrain.cloud"
-        
-        # Email body
-        items_html = "<br>".join([
-            f"- {item['name']} x{item['quantity']} - €{item['price'] * item['quantity']:.2f}"
-            for item in order_data['items']
-        ])
-        
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif;">
-            <h2 style="color: #7a9053;">Neue Bestellung eingegangen!</h2>
-            <p><strong>Bestellnummer:</strong> {order_data['id']}</p>
-            <p><strong>Kunde Email:</strong> {order_data['customer_email']}</p>
-            <p><strong>Datum:</strong> {datetime.now(timezone.utc).strftime('%d.%m.%Y %H:%M:%S')} UTC</p>
-            <hr>
-            <h3>Bestellte Produkte:</h3>
-            <p>{items_html}</p>
-            <hr>
-            <p><strong>Gesamtbetrag:</strong> €{order_data['total']:.2f}</p>
-            <p><strong>PayPal Payment ID:</strong> {order_data.get('payment_id', 'N/A')}</p>
-            <p><strong>Status:</strong> {order_data['status']}</p>
-        </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(html_body, 'html'))
-        
-        # Send email
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            start_tls=True
-        )
+        html_body, text_body = email_templates.render("admin_new_order", order=order_data)
         
-        logging.info(f"Order notification email sent for order {order_data['id']}")
+        await email_outbox.enqueue(
+            to=notification_email,
+            subject="🛍️ Neue Bestellung - apebrain.cloud",
+            html=html_body,
+            text=text_body,
+            idempotency_key=f"order:{order_data['id']}:admin-new-order"
+        )
+        logging.info(f"Order notification email queued for order {order_data['id']}")
     except Exception as e:
-        logging.error(f"Failed to send order notification: {str(e)}")
+        logging.error(f"Failed to queue order notification: {str(e)}")
 
 # Customer order status notification
 async def send_customer_notification(order_data, status_type: str):
     try:
-        smtp_host = os.environ.get('SMTP_HOST')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
-        
-        if not all([smtp_host, smtp_user, smtp_password]):
-            logging.warning("Email configuration incomplete, skipping customer notification")
-            return
-        
         customer_email = order_data.get('customer_email')
         if not customer_email:
             logging.warning("No customer email found")
             return
         
-        # Create email
-        message = MIMEMultipart()
-        message['From'] = smtp_user
-        message['To'] = customer_email
-        
-        # Different email content based on status
-        if status_type == 'paid':
-            subject = "✅ Bestellbestätigung - apebrain.cloud"
-            status_text = "Ihre Bestellung wurde erfolgreich bezahlt und wird bearbeitet."
-        elif status_type == 'shipped':
-            subject = "📦 Ihre Bestellung wurde versendet - apebrain.cloud"
-            tracking_html = ""
-            if order_data.get('tracking_number'):
-                tracking_url = order_data.get('tracking_url', '#')
-                tracking_html = f'<p><strong>Sendungsverfolgung:</strong> <a href="{tracking_url}">{order_data["tracking_number"]}</a></p>'
-            status_text = f"Ihre Bestellung ist unterwegs!<br>{tracking_html}"
-        elif status_type == 'delivered':
-            subject = "🏠 Ihre Bestellung wurde zugestellt - apebrain.cloud"
-            status_text = "Ihre Bestellung wurde erfolgreich zugestellt. Wir hoffen, Sie genießen Ihre Produkte!"
-        else:
-            subject = f"📬 Update zu Ihrer Bestellung - apebrain.cloud"
-            status_text = f"Status Ihrer Bestellung: {order_data.get('status', 'N/A')}"
-        
-        message['Subject'] = subject
-        
-        items_html = "<br>".join([
-            f"- {item['name']} x{item['quantity']} - €{item['price'] * item['quantity']:.2f}"
-            for item in order_data.get('items', [])
-        ])
-        
-        tracking_section = ""
-        if order_data.get('tracking_url') and order_data.get('tracking_number'):
-            tracking_section = f"""
-            <div style="margin-top: 1.5rem; padding: 1rem; background: #f3f4f6; border-radius: 8px;">
-                <h3 style="color: #7a9053; margin-top: 0;">Sendungsverfolgung</h3>
-                <p><strong>Tracking-Nummer:</strong> {order_data['tracking_number']}</p>
-                <p><strong>Versanddienstleister:</strong> {order_data.get('shipping_carrier', 'N/A')}</p>
-                <p><a href="{order_data['tracking_url']}" style="color: #7a9053; text-decoration: underline;">Sendung verfolgen →</a></p>
-            </div>
-            """
-        
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-            <div style="background: #7a9053; color: white; padding: 2rem; text-align: center;">
-                <h1 style="margin: 0;">apebrain.cloud</h1>
-            </div>
-            <div style="padding: 2rem;">
-                <h2 style="color: #3a4520;">{subject.split(' - ')[0]}</h2>
-                <p>{status_text}</p>
-                <hr style="border: 1px solid #e8ebe0; margin: 1.5rem 0;">
-                <p><strong>Bestellnummer:</strong> {order_data.get('id', 'N/A')[:12]}...</p>
-                <p><strong>Datum:</strong> {datetime.now(timezone.utc).strftime('%d.%m.%Y')}</p>
-                <h3 style="color: #3a4520;">Bestellte Produkte:</h3>
-                <p style="margin-left: 1rem;">{items_html}</p>
-                <hr style="border: 1px solid #e8ebe0; margin: 1.5rem 0;">
-                <p><strong>Gesamtbetrag:</strong> €{order_data.get('total', 0):.2f}</p>
-                {tracking_section}
-                <div style="margin-top: 2rem; padding-top: 1.5rem; border-top: 1px solid #e8ebe0; color: #7a9053; font-size: 0.9rem;">
-                    <p>Bei Fragen kontaktieren Sie uns: apebrain333@gmail.com</p>
-                    <p>Vielen Dank für Ihren Einkauf!</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(html_body, 'html'))
-        
-        # Send email
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            start_tls=True
+        subject = CUSTOMER_STATUS_SUBJECTS.get(status_type, "📬 Update zu Ihrer Bestellung - apebrain.cloud")
+        html_body, text_body = email_templates.render(
+            "customer_order_status",
+            order=order_data,
+            status_type=status_type,
+            heading=subject.split(' - ')[0]
         )
         
-        logging.info(f"Customer notification sent to {customer_email} for order {order_data.get('id')}")
+        # One email per order and status (a new tracking number is a new shipment notice)
+        idempotency_key = f"order:{order_data.get('id')}:customer-{status_type}"
+        if status_type == 'shipped' and order_data.get('tracking_number'):
+            idempotency_key += f":{order_data['tracking_number']}"
+        
+        await email_outbox.enqueue(
+            to=customer_email,
+            subject=subject,
+            html=html_body,
+            text=text_body,
+            idempotency_key=idempotency_key
+        )
+        logging.info(f"Customer notification queued for {customer_email} for order {order_data.get('id')}")
     except Exception as e:
-        logging.error(f"Failed to send customer notification: {str(e)}")
+        logging.error(f"Failed to queue customer notification: {str(e)}")
 
 # Admin delivery completion notification
 async def send_admin_delivery_notification(order_data):
     try:
-        smtp_host = os.environ.get('SMTP_HOST')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
         notification_email = os.environ.get('NOTIFICATION_EMAIL')
-        
-        if not all([smtp_host, smtp_user, smtp_password, notification_email]):
+        if not notification_email:
             logging.warning("Email configuration incomplete, skipping admin delivery notification")
             return
         
-        # Create email
-        message = MIMEMultipart()
-        message['From'] = smtp_user
-        message['To'] = notification_email
-        message['Subject'] = "✅ Bestellung zugestellt - apebrain.cloud"
-        
-        items_html = "<br>".join([
-            f"- {item['name']} x{item['quantity']} - €{item['price'] * item['quantity']:.2f}"
-            for item in order_data.get('items', [])
-        ])
-        
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif;">
-            <h2 style="color: #22c55e;">Bestellung erfolgreich zugestellt! ✅</h2>
-            <p>Die folgende Bestellung wurde erfolgreich an den Kunden zugestellt:</p>
-            <hr>
-            <p><strong>Bestellnummer:</strong> {order_data.get('id', 'N/A')}</p>
-            <p><strong>Kunde Email:</strong> {order_data.get('customer_email', 'N/A')}</p>
-            <p><strong>Zugestellt am:</strong> {datetime.now(timezone.utc).strftime('%d.%m.%Y %H:%M:%S')} UTC</p>
-            <hr>
-            <h3>Bestellte Produkte:</h3>
-            <p>{items_html}</p>
-            <hr>
-            <p><strong>Gesamtbetrag:</strong> €{order_data.get('total', 0):.2f}</p>
-            {f'<p><strong>Tracking-Nummer:</strong> {order_data.get("tracking_number", "N/A")}</p>' if order_data.get('tracking_number') else ''}
-            <p style="margin-top: 2rem; color: #7a9053;">Diese Bestellung ist nun abgeschlossen.</p>
-        </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(html_body, 'html'))
-        
-        # Send email
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            start_tls=True
-        )
+        html_body, text_body = email_templates.render("admin_order_delivered", order=order_data)
         
-        logging.info(f"Admin delivery notification sent for order {order_data.get('id')}")
+        await email_outbox.enqueue(
+            to=notification_email,
+            subject="✅ Bestellung zugestellt - apebrain.cloud",
+            html=html_body,
+            text=text_body,
+            idempotency_key=f"order:{order_data.get('id')}:admin-delivered"
+        )
+        logging.info(f"Admin delivery notification queued for order {order_data.get('id')}")
     except Exception as e:
-        logging.error(f"Failed to send admin delivery notification: {str(e)}")
-
-
+        logging.error(f"Failed to queue admin delivery notification: {str(e)}")
 
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware: stored dates come back as aware UTC datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
-# Configure PayPal
-paypalrestsdk.configure({
-    "mode": os.environ.get('PAYPAL_MODE', 'sandbox'),
-    "client_id": os.environ.get('PAYPAL_CLIENT_ID', ''),
-    "client_secret": os.environ.get('PAYPAL_CLIENT_SECRET', '')
-})
+# Outbound email queue, drained by a background worker (see email_outbox.py)
+email_outbox = EmailOutbox(db)
+
+# Indexes for every query path. Unique where the code already assumes one
+# document per key; partial filters skip legacy documents without the field.
+STRING_FIELD = {"$type": "string"}
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("google_id", ASCENDING)], name="google_id_unique", unique=True,
+                   partialFilterExpression={"google_id": STRING_FIELD}),
+    ],
+    "blogs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        IndexModel([("status", ASCENDING), ("published_at", DESCENDING), ("id", DESCENDING)], name="status_published_at_id"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("payment_id", ASCENDING)], name="payment_id_unique", unique=True,
+                   partialFilterExpression={"payment_id": STRING_FIELD}),
+        IndexModel([("customer_email", ASCENDING), ("created_at", DESCENDING)], name="customer_email_created_at"),
+        IndexModel([("viewed", ASCENDING), ("status", ASCENDING)], name="viewed_status"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+    ],
+    "coupons": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True),
+        IndexModel([("code", ASCENDING), ("is_active", ASCENDING)], name="code_is_active"),
+        IndexModel([("is_active", ASCENDING)], name="is_active"),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True,
+                   partialFilterExpression={"id": STRING_FIELD}),
+    ],
+    "password_reset_tokens": [
+        IndexModel([("token", ASCENDING)], name="token_unique", unique=True),
+    ],
+    "settings": [
+        IndexModel([("type", ASCENDING)], name="type_unique", unique=True),
+    ],
+    "stats": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "analytics_rollups": [
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], name="granularity_bucket_unique", unique=True),
+    ],
+    "color_profiles": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "email_outbox": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("idempotency_key", ASCENDING)], name="idempotency_key_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+    ],
+    "media": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "migrations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "generation_jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Jobs are dropped by Mongo once expires_at (a day after creation) passes
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "generation_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # LRU eviction order
+        IndexModel([("last_used_at", ASCENDING)], name="last_used_at"),
+    ],
+}
+
+async def ensure_indexes():
+    """Create any missing indexes declared in INDEXES"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            logging.error(f"Could not read indexes for {collection_name}: {str(e)}")
+            continue
+        
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                continue
+            started = time.monotonic()
+            try:
+                await collection.create_indexes([model])
+                logging.info(f"Created index {collection_name}.{name} in {(time.monotonic() - started) * 1000:.0f} ms")
+            except PyMongoError as e:
+                # e.g. duplicate keys in legacy data for a unique index;
+                # keep serving and let the admin clean up the data
+                logging.error(f"Failed to create index {collection_name}.{name}: {str(e)}")
+
+# Media store for uploaded images/audio (see media_store.py)
+media_store = create_media_store(db, ROOT_DIR)
+# Responsive image sizes are rendered in a process pool (see image_derivatives.py)
+image_pipeline = ImageDerivativePipeline(media_store)
+
+async def store_image(data: bytes, content_type: str = "image/jpeg") -> str:
+    """Store image bytes, queue derivative generation and return the media URL"""
+    media = await media_store.save(data, content_type)
+    image_pipeline.schedule(media["id"])
+    return media_url(media["id"])
+
+# Pexels image search: shared client, search results and photos cached on disk
+pexels = PexelsClient(
+    os.environ.get('PEXELS_API_KEY'),
+    media_store,
+    store_image,
+    Path(os.environ.get('PEXELS_CACHE_DIR', str(ROOT_DIR / 'cache' / 'pexels')))
+)
+
+# Configure PayPal (shared async client, see paypal_client.py)
+paypal = create_paypal_client()
+
+# Google sign-in keys, cached in memory and refreshed in the background
+google_keys = GoogleKeyCache()
+
+# Landing page, blog feature and color profile settings, cached in memory
+settings_cache = SettingsCache(db)
+
+# Bumped on every blog/coupon write; the public GETs derive their ETags from them
+blogs_version = VersionCounter(db, "blogs_version")
+coupons_version = VersionCounter(db, "coupons_version")
+
+# Order counters for the dashboard badges, kept up to date with $inc (see order_stats.py)
+order_stats = OrderStats(db)
+
+# Hourly/daily sales rollups for the analytics endpoint (see order_analytics.py)
+order_analytics = OrderAnalytics(db)
+# What the status/tracking/delete endpoints read back for the counters and rollups
+ORDER_CHANGE_PROJECTION = {**STATS_PROJECTION, **ROLLUP_PROJECTION}
+
+# Live order events for the admin UI (change stream or in-process, see order_events.py)
+order_events = OrderEvents(db, order_stats)
+
+async def blogs_changed():
+    await blogs_version.bump()
+    await refresh_auto_galleries()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -363,9 +380,25 @@ class BlogPost(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     published_at: Optional[datetime] = None
 
+# Stored blogs are validated by BlogPost on write and returned as stored
+BLOG_PROJECTION = {"_id": 0, **{field: 1 for field in BlogPost.model_fields}}
+
 class BlogPostCreate(BaseModel):
     keywords: str
 
+class BlogSummary(BaseModel):
+    id: str
+    title: str
+    excerpt: str = ""
+    thumbnail_url: Optional[str] = None
+    thumbnail_srcset: Optional[dict] = None
+    created_at: Optional[datetime] = None
+    published_at: Optional[datetime] = None
+
+class BlogSummaryPage(BaseModel):
+    items: List[BlogSummary]
+    next_cursor: Optional[str] = None
+
 class BlogPostUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
@@ -449,10 +482,41 @@ class CouponValidate(BaseModel):
     code: str
     order_total: float
 
-class GenerateResponse(BaseModel):
-    title: str
-    content: str
-    image_base64: Optional[str] = None
+class GenerateJob(BaseModel):
+    job_id: str
+    status: str  # queued, running, done, failed
+    keywords: str
+    title: Optional[str] = None
+    content: str = ""
+    image_url: Optional[str] = None  # /api/media/<hash> reference
+    error: Optional[str] = None
+    cached: bool = False  # served from the generation cache
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class LandingSettings(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    show_blog: bool = True
+    show_shop: bool = True
+    show_minigames: bool = True
+    blog_gallery_mode: str = "none"  # none, manual, auto
+    shop_gallery_mode: str = "none"
+    minigames_gallery_mode: str = "none"
+    blog_gallery_images: List[str] = []
+    shop_gallery_images: List[str] = []
+    minigames_gallery_images: List[str] = []
+    card_bg_color_start: str = "rgba(167, 139, 250, 0.15)"
+    card_bg_color_middle: str = "rgba(139, 92, 246, 0.12)"
+    card_bg_color_end: str = "rgba(124, 58, 237, 0.15)"
+    # Maintained by refresh_auto_galleries, served when the mode is "auto"
+    blog_auto_gallery_images: List[str] = []
+    shop_auto_gallery_images: List[str] = []
+
+class BlogFeatures(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    enable_video: bool = True
+    enable_audio: bool = True
+    enable_text_to_speech: bool = True
 
 # Admin authentication
 @api_router.post("/admin/login")
@@ -503,6 +567,72 @@ async def update_admin_settings(settings: AdminSettingsUpdate):
     
     return {"success": True, "message": "Settings updated successfully"}
 
+# Outbound email queue (admin) - inspect dead letters and failed sends
+@api_router.get("/admin/email-outbox")
+async def get_email_outbox(status: Optional[str] = "dead", limit: int = Query(50, ge=1, le=200)):
+    try:
+        query = {"status": status} if status else {}
+        messages = await db.email_outbox.find(query, {"_id": 0, "html": 0, "text": 0}).sort("created_at", -1).to_list(limit)
+        return messages
+    except Exception as e:
+        logging.error(f"Error fetching email outbox: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch email outbox")
+
+# Re-queue a dead-lettered email (admin)
+@api_router.post("/admin/email-outbox/{outbox_id}/retry")
+async def retry_outbox_email(outbox_id: str):
+    try:
+        if not await email_outbox.retry(outbox_id):
+            raise HTTPException(status_code=404, detail="No dead-lettered email with this id")
+        return {"success": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error retrying email: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to retry email")
+
+# Sales analytics from the hourly/daily rollups (admin)
+@api_router.get("/admin/analytics")
+async def get_sales_analytics(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("day", pattern="^(hour|day)$")
+):
+    try:
+        # Naive bounds are taken as UTC; defaults to the last 30 days
+        end = as_datetime(end) or datetime.now(timezone.utc)
+        start = as_datetime(start) or end - timedelta(days=30)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if granularity == "hour" and end - start > timedelta(days=31):
+            raise HTTPException(status_code=400, detail="Hourly analytics are limited to 31 days")
+        
+        analytics = await order_analytics.query(start, end, granularity)
+        await catalog.ensure_fresh()
+        for entry in analytics["products"]:
+            entry["name"] = catalog.products.get(entry["product_id"], {}).get("name")
+        return analytics
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error fetching analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch analytics")
+
+# Recompute the analytics rollups from all orders (admin)
+@api_router.post("/admin/analytics/rebuild")
+async def rebuild_sales_analytics():
+    try:
+        buckets = await order_analytics.rebuild()
+        return {"success": True, "buckets": buckets}
+    except Exception as e:
+        logging.error(f"Error rebuilding analytics: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to rebuild analytics")
+
+# Password hashing pool metrics (admin)
+@api_router.get("/admin/metrics/password-hashing")
+async def get_password_hashing_metrics():
+    return password_hasher.metrics()
+
 # ============= CUSTOMER AUTH ENDPOINTS =============
 # Register new customer
 @api_router.post("/auth/register")
@@ -517,73 +647,52 @@ async def register_customer(user_data: UserCreate):
         user_doc = {
             "id": str(uuid.uuid4()),
             "email": user_data.email,
-            "hashed_password": get_password_hash(user_data.password),
+            "hashed_password": await get_password_hash(user_data.password),
             "first_name": user_data.first_name,
             "last_name": user_data.last_name,
             "auth_provider": "email",
             "is_member": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "last_login": None
         }
         
         await db.users.insert_one(user_doc)
         
-        # Send notification email to admin
+        # Queue notification email to admin
         try:
-            smtp_host = os.environ.get('SMTP_HOST')
-            smtp_port = int(os.environ.get('SMTP_PORT', 587))
-            smtp_user = os.environ.get('SMTP_USER')
-            smtp_password = os.environ.get('SMTP_PASSWORD')
             admin_email = os.environ.get('SMTP_USER')  # Admin email
             
-            message = MIMEMultipart("alternative")
-            message["Subject"] = "🎉 Neue Registrierung - ApeBrain.cloud"
-            message["From"] = smtp_user
-            message["To"] = admin_email
-            
-            html_content = f"""
-            <html>
-            <body style="font-family: Arial, sans-serif; background-color: #f8f9fa; padding: 20px;">
-                <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 10px; padding: 30px;">
-                    <h2 style="color: #7a9053;">🍄 Neue Mitgliederregistrierung</h2>
-                    <p>Ein neuer Kunde hat sich registriert!</p>
-                    <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                        <p style="margin: 5px 0;"><strong>Email:</strong> {user_doc["email"]}</p>
-                        <p style="margin: 5px 0;"><strong>Name:</strong> {user_doc.get("first_name", "")} {user_doc.get("last_name", "")}</p>
-                        <p style="margin: 5px 0;"><strong>Registriert am:</strong> {datetime.now(timezone.utc).strftime("%d.%m.%Y %H:%M")} UTC</p>
-                    </div>
-                    <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                    <p style="color: #9ca3af; font-size: 0.8rem;">ApeBrain.cloud Admin Notification</p>
-                </div>
-            </body>
-            </html>
-            """
-            
-            message.attach(MIMEText(html_content, "html"))
+            html_content, text_content = email_templates.render("admin_new_member", user=user_doc, provider="email")
             
-            await aiosmtplib.send(
-                message,
-                hostname=smtp_host,
-                port=smtp_port,
-                username=smtp_user,
-                password=smtp_password,
-                start_tls=True
+            await email_outbox.enqueue(
+                to=admin_email,
+                subject="🎉 Neue Registrierung - ApeBrain.cloud",
+                html=html_content,
+                text=text_content,
+                idempotency_key=f"user:{user_doc['id']}:registered"
             )
         except Exception as email_error:
-            logging.error(f"Failed to send registration notification: {str(email_error)}")
+            logging.error(f"Failed to queue registration notification: {str(email_error)}")
         
         # Create access token
         access_token = create_access_token(data={"sub": user_doc["id"]})
-# Generate blog content using Google Gemini API
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
         
-        prompt = f"""You are an expert writer specializing in health, nature, consciousness, spirituality, and holistic wellness.
-
-Write a comprehensive blog post about: {input.keywords}. Include an engaging title, detailed content with sections covering the main topic, benefits, scientific research (if applicable), practical applications, and important considerations. Make it around 800-1200 words. Format with proper headings using markdown."""
-        
-        response = model.generate_content(prompt)
-        blog_content = response.text        
+        return {
+            "success": True,
+            "access_token": access_token,
+            "token_type": "bearer",
+            "user": {
+                "id": user_doc["id"],
+                "email": user_doc["email"],
+                "first_name": user_doc.get("first_name"),
+                "last_name": user_doc.get("last_name"),
+                "is_member": True
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error registering user: {str(e)}")
         raise HTTPException(status_code=500, detail="Registration failed")
 
 # Customer login
@@ -596,13 +705,13 @@ async def login_customer(login_data: UserLogin):
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Verify password
-        if not verify_password(login_data.password, user["hashed_password"]):
+        if not await verify_password(login_data.password, user["hashed_password"]):
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         # Update last login
         await db.users.update_one(
             {"id": user["id"]},
-            {"$set": {"last_login": datetime.now(timezone.utc).isoformat()}}
+            {"$set": {"last_login": datetime.now(timezone.utc)}}
         )
         
         # Create access token
@@ -676,50 +785,22 @@ async def request_password_reset(request: PasswordResetRequest):
         await db.password_reset_tokens.insert_one({
             "user_id": user["id"],
             "token": reset_token,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             "used": False
         })
         
-        # Send email with reset link
-        smtp_host = os.environ.get('SMTP_HOST')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_user = os.environ.get('SMTP_USER')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
+        # Queue email with reset link
         frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
         
         reset_link = f"{frontend_url}/reset-password?token={reset_token}"
         
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "Password Reset - ApeBrain.cloud"
-        message["From"] = smtp_user
-        message["To"] = user["email"]
-        
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; background-color: #f8f9fa; padding: 20px;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 10px; padding: 30px;">
-                <h2 style="color: #7a9053;">🍄 Password Reset Request</h2>
-                <p>Hello,</p>
-                <p>You requested to reset your password for your ApeBrain.cloud account.</p>
-                <p>Click the button below to reset your password (link expires in 1 hour):</p>
-                <a href="{reset_link}" style="display: inline-block; background-color: #7a9053; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; margin: 20px 0;">Reset Password</a>
-                <p style="color: #6b7280; font-size: 0.9rem;">If you didn't request this, please ignore this email.</p>
-                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                <p style="color: #9ca3af; font-size: 0.8rem;">ApeBrain.cloud - god knows how</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(html_content, "html"))
-        
-        await aiosmtplib.send(
-            message,
-            hostname=smtp_host,
-            port=smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            start_tls=True
+        html_content, text_content = email_templates.render("password_reset", reset_link=reset_link)
+        
+        await email_outbox.enqueue(
+            to=user["email"],
+            subject="Password Reset - ApeBrain.cloud",
+            html=html_content,
+            text=text_content
         )
         
         return {"success": True, "message": "If your email is registered, you will receive a password reset link"}
@@ -745,7 +826,7 @@ async def reset_password(reset_data: PasswordReset):
             raise HTTPException(status_code=400, detail="Reset token already used or invalid")
         
         # Update password
-        hashed_password = get_password_hash(reset_data.new_password)
+        hashed_password = await get_password_hash(reset_data.new_password)
         await db.users.update_one(
             {"id": user_id},
             {"$set": {"hashed_password": hashed_password}}
@@ -799,12 +880,8 @@ async def verify_google_token(token_data: dict):
         
         client_id = os.environ.get('GOOGLE_CLIENT_ID')
         
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
-            token, 
-            google_requests.Request(), 
-            client_id
-        )
+        # Verify the token locally against the cached Google signing keys
+        idinfo = await google_keys.verify(token, client_id)
         
         # Get user info from token
         google_user_id = idinfo['sub']
@@ -826,49 +903,30 @@ async def verify_google_token(token_data: dict):
                 "auth_provider": "google",
                 "google_id": google_user_id,
                 "is_member": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "last_login": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc),
+                "last_login": datetime.now(timezone.utc)
             }
             
             await db.users.insert_one(user_doc)
             
-            # Send admin notification
+            # Queue admin notification
             try:
-                smtp_host = os.environ.get('SMTP_HOST')
-                smtp_port = int(os.environ.get('SMTP_PORT', 587))
-                smtp_user = os.environ.get('SMTP_USER')
-                smtp_password = os.environ.get('SMTP_PASSWORD')
+                html_content, text_content = email_templates.render("admin_new_member", user=user_doc, provider="google")
                 
-                message = MIMEMultipart("alternative")
-                message["Subject"] = "🎉 Neue Google-Registrierung - ApeBrain.cloud"
-                message["From"] = smtp_user
-                message["To"] = smtp_user
-                
-                html_content = f"""
-                <html>
-                <body style="font-family: Arial, sans-serif; background-color: #f8f9fa; padding: 20px;">
-                    <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 10px; padding: 30px;">
-                        <h2 style="color: #7a9053;">🍄 Neue Google-Registrierung</h2>
-                        <p>Ein neuer Kunde hat sich über Google angemeldet!</p>
-                        <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                            <p style="margin: 5px 0;"><strong>Email:</strong> {email}</p>
-                            <p style="margin: 5px 0;"><strong>Name:</strong> {first_name} {last_name}</p>
-                            <p style="margin: 5px 0;"><strong>Auth Provider:</strong> Google</p>
-                        </div>
-                    </div>
-                </body>
-                </html>
-                """
-                
-                message.attach(MIMEText(html_content, "html"))
-                await aiosmtplib.send(message, hostname=smtp_host, port=smtp_port, username=smtp_user, password=smtp_password, start_tls=True)
+                await email_outbox.enqueue(
+                    to=os.environ.get('SMTP_USER'),
+                    subject="🎉 Neue Google-Registrierung - ApeBrain.cloud",
+                    html=html_content,
+                    text=text_content,
+                    idempotency_key=f"user:{user_doc['id']}:registered"
+                )
             except Exception as email_error:
-                logging.error(f"Failed to send notification: {str(email_error)}")
+                logging.error(f"Failed to queue notification: {str(email_error)}")
             
             user = user_doc
         else:
             # Update last login and google_id if not set
-            update_data = {"last_login": datetime.now(timezone.utc).isoformat()}
+            update_data = {"last_login": datetime.now(timezone.utc)}
             if not user.get("google_id"):
                 update_data["google_id"] = google_user_id
             
@@ -889,6 +947,8 @@ async def verify_google_token(token_data: dict):
                 "is_member": True
             }
         }
+    except HTTPException:
+        raise
     except ValueError as e:
         logging.error(f"Invalid token: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -896,59 +956,72 @@ async def verify_google_token(token_data: dict):
         logging.error(f"Error verifying Google token: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to verify Google login")
 
+# Embedded base64 images (before migrate_media.py has run)
+DATA_URL_PREFIX = re.compile("^data:")
+
+# Landing page auto galleries are precomputed into the settings document
+# whenever blogs or products change, so the landing page never queries them
+async def refresh_auto_galleries():
+    try:
+        # Newest published blogs with images, first image of each. Embedded
+        # base64 data: URLs are skipped; every page load reads these settings
+        blogs = await db.blogs.aggregate([
+            {"$match": {"status": "published", "image_urls.0": {"$exists": True}}},
+            {"$sort": {"published_at": -1}},
+            {"$project": {"_id": 0, "image": {"$arrayElemAt": [{"$filter": {
+                "input": "$image_urls",
+                "as": "url",
+                "cond": {"$ne": [{"$substrCP": ["$$url", 0, 5]}, "data:"]}
+            }}, 0]}}},
+            {"$match": {"image": {"$exists": True}}},
+            {"$limit": 3}
+        ]).to_list(length=3)
+        products = await db.products.find(
+            {"image_url": {"$type": "string", "$ne": "", "$not": DATA_URL_PREFIX}},
+            {"_id": 0, "image_url": 1}
+        ).limit(3).to_list(length=3)
+        galleries = {
+            "blog_auto_gallery_images": [blog["image"] for blog in blogs],
+            "shop_auto_gallery_images": [product["image_url"] for product in products]
+        }
+
+        current = await db.settings.find_one({"type": "landing_page"}, {"_id": 0, **{field: 1 for field in galleries}})
+        if current and all(current.get(field) == images for field, images in galleries.items()):
+            return
+        await db.settings.update_one({"type": "landing_page"}, {"$set": galleries}, upsert=True)
+        await settings_cache.invalidate()
+    except Exception as e:
+        # The gallery stays as it was until the next change
+        logging.error(f"Error refreshing landing page auto galleries: {str(e)}")
+
+async def load_landing_settings() -> LandingSettings:
+    settings = await db.settings.find_one({"type": "landing_page"}, {"_id": 0})
+    return LandingSettings(**settings) if settings else LandingSettings()
+
 # Get landing page settings (button visibility + gallery)
 @api_router.get("/landing-settings")
-async def get_landing_settings():
+async def get_landing_settings(request: Request, response: Response):
     try:
-        settings = await db.settings.find_one({"type": "landing_page"}, {"_id": 0})
-        if not settings:
-            # Return defaults
-            return {
-                "show_blog": True,
-                "show_shop": True,
-                "show_minigames": True,
-                "blog_gallery_mode": "none",
-                "shop_gallery_mode": "none",
-                "minigames_gallery_mode": "none",
-                "blog_gallery_images": [],
-                "shop_gallery_images": [],
-                "minigames_gallery_images": [],
-                "card_bg_color_start": "rgba(167, 139, 250, 0.15)",
-                "card_bg_color_middle": "rgba(139, 92, 246, 0.12)",
-                "card_bg_color_end": "rgba(124, 58, 237, 0.15)"
-            }
-        
-        # If gallery mode is "auto", fetch images from database
+        cached = await settings_cache.get("landing_page", load_landing_settings)
+        headers = validator_headers(make_etag("landing_page", settings_cache.version.seen), settings_cache.version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        settings = cached.model_dump()
+        
+        # If gallery mode is "auto", serve the precomputed images
+        blog_auto_images = settings.pop("blog_auto_gallery_images")
+        shop_auto_images = settings.pop("shop_auto_gallery_images")
         if settings.get("blog_gallery_mode") == "auto":
-            blogs = await db.blogs.find({"status": "published"}, {"_id": 0, "image_urls": 1}).limit(3).to_list(length=3)
-            auto_images = []
-            for blog in blogs:
-                if blog.get("image_urls"):
-                    auto_images.extend(blog["image_urls"][:1])  # Take first image from each blog
-            settings["blog_gallery_images"] = auto_images[:3]  # Max 3 images
-        
+            settings["blog_gallery_images"] = blog_auto_images
         if settings.get("shop_gallery_mode") == "auto":
-            products = await db.products.find({"image_url": {"$exists": True}}, {"_id": 0, "image_url": 1}).limit(3).to_list(length=3)
-            settings["shop_gallery_images"] = [p["image_url"] for p in products if p.get("image_url")][:3]
+            settings["shop_gallery_images"] = shop_auto_images
         
+        response.headers.update(headers)
         return settings
     except Exception as e:
         logging.error(f"Error fetching landing settings: {str(e)}")
         # Return defaults on error
-        return {
-            "show_blog": True,
-            "show_shop": True,
-            "show_minigames": True,
-            "blog_gallery_mode": "none",
-            "shop_gallery_mode": "none",
-            "minigames_gallery_mode": "none",
-            "blog_gallery_images": [],
-            "shop_gallery_images": [],
-            "minigames_gallery_images": [],
-            "card_bg_color_start": "rgba(167, 139, 250, 0.15)",
-            "card_bg_color_middle": "rgba(139, 92, 246, 0.12)",
-            "card_bg_color_end": "rgba(124, 58, 237, 0.15)"
-        }
+        return LandingSettings().model_dump(exclude={"blog_auto_gallery_images", "shop_auto_gallery_images"})
 
 # Update landing page settings (button visibility + gallery)
 @api_router.post("/landing-settings")
@@ -975,6 +1048,7 @@ async def update_landing_settings(settings: dict):
             {"$set": settings_doc},
             upsert=True
         )
+        await settings_cache.invalidate()
         
         return {"success": True, "message": "Landing page settings updated successfully"}
     except Exception as e:
@@ -988,10 +1062,10 @@ async def upload_landing_gallery_image(section: str, file: UploadFile = File(...
         if section not in ["blog", "shop", "minigames"]:
             raise HTTPException(status_code=400, detail="Invalid section. Must be 'blog', 'shop', or 'minigames'")
         
-        # Read and encode image
-        contents = await file.read()
-        base64_image = base64.b64encode(contents).decode()
-        image_url = f"data:{file.content_type};base64,{base64_image}"
+        # Store image in media store and reference it by hash
+        media = await media_store.save_upload(file)
+        image_pipeline.schedule(media["id"])
+        image_url = media_url(media["id"])
         
         # Get current settings
         settings = await db.settings.find_one({"type": "landing_page"})
@@ -1019,6 +1093,7 @@ async def upload_landing_gallery_image(section: str, file: UploadFile = File(...
             {"$set": {field_name: settings[field_name]}},
             upsert=True
         )
+        await settings_cache.invalidate()
         
         return {
             "success": True,
@@ -1036,8 +1111,10 @@ async def upload_landing_gallery_image(section: str, file: UploadFile = File(...
 @api_router.get("/color-profiles")
 async def get_color_profiles():
     try:
-        profiles = await db.color_profiles.find({}, {"_id": 0}).to_list(length=100)
-        return profiles
+        return await settings_cache.get(
+            "color_profiles",
+            lambda: db.color_profiles.find({}, {"_id": 0}).to_list(length=100)
+        )
     except Exception as e:
         logging.error(f"Error fetching color profiles: {str(e)}")
         return []
@@ -1061,10 +1138,11 @@ async def save_color_profile(profile: dict):
             "endG": profile.get("endG"),
             "endB": profile.get("endB"),
             "endOpacity": profile.get("endOpacity"),
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         
         await db.color_profiles.insert_one(profile_doc)
+        await settings_cache.invalidate()
         return {"success": True, "message": "Color profile saved successfully"}
     except Exception as e:
         logging.error(f"Error saving color profile: {str(e)}")
@@ -1077,6 +1155,7 @@ async def delete_color_profile(profile_id: str):
         result = await db.color_profiles.delete_one({"id": profile_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Color profile not found")
+        await settings_cache.invalidate()
         return {"success": True, "message": "Color profile deleted successfully"}
     except HTTPException:
         raise
@@ -1085,26 +1164,24 @@ async def delete_color_profile(profile_id: str):
         raise HTTPException(status_code=500, detail="Failed to delete color profile")
 
 # ============= BLOG FEATURE SETTINGS =============
+async def load_blog_features() -> BlogFeatures:
+    settings = await db.settings.find_one({"type": "blog_features"}, {"_id": 0})
+    return BlogFeatures(**settings) if settings else BlogFeatures()
+
 # Get blog feature settings
 @api_router.get("/blog-features")
-async def get_blog_features():
+async def get_blog_features(request: Request, response: Response):
     try:
-        settings = await db.settings.find_one({"type": "blog_features"}, {"_id": 0})
-        if not settings:
-            # Return defaults
-            return {
-                "enable_video": True,
-                "enable_audio": True,
-                "enable_text_to_speech": True
-            }
-        return settings
+        features = await settings_cache.get("blog_features", load_blog_features)
+        headers = validator_headers(make_etag("blog_features", settings_cache.version.seen), settings_cache.version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        features = features.model_dump()
+        response.headers.update(headers)
+        return features
     except Exception as e:
         logging.error(f"Error fetching blog features: {str(e)}")
-        return {
-            "enable_video": True,
-            "enable_audio": True,
-            "enable_text_to_speech": True
-        }
+        return BlogFeatures().model_dump()
 
 # Update blog feature settings
 @api_router.post("/blog-features")
@@ -1122,77 +1199,70 @@ async def update_blog_features(settings: dict):
             {"$set": settings_doc},
             upsert=True
         )
+        await settings_cache.invalidate()
         
         return {"success": True, "message": "Blog features updated successfully"}
     except Exception as e:
         logging.error(f"Error updating blog features: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to update blog features")
 
-# Generate blog post with AI
-@api_router.post("/blogs/generate", response_model=GenerateResponse)
-async def generate_blog(input: BlogPostCreate):
+# Cover image for a generated blog: first Pexels hit, stored in the media store
+async def fetch_blog_image(keywords: str) -> Optional[str]:
+    if not pexels.configured:
+        return None
+    image_urls = await pexels.fetch_images(keywords, 1)
+    return image_urls[0] if image_urls else None
+
+# AI blog generation jobs (see blog_generation.py)
+blog_generation = BlogGenerationJobs(db, fetch_image=fetch_blog_image, cache=GenerationCache(db))
+
+def generate_job_response(job: dict) -> GenerateJob:
+    return GenerateJob(job_id=job["id"], **{k: v for k, v in job.items() if k in GenerateJob.model_fields})
+
+# Generate blog post with AI - starts a background job (force=true bypasses the cache)
+@api_router.post("/blogs/generate", response_model=GenerateJob, status_code=202)
+async def generate_blog(input: BlogPostCreate, force: bool = False):
     try:
-        gemini_api_key = os.environ.get('GEMINI_API_KEY')
-        
-        # Generate blog content using Gemini Flash Lite
-        chat = LlmChat(
-            api_key=gemini_api_key,
-            session_id=f"blog-gen-{uuid.uuid4()}",
-            system_message="You are an expert writer specializing in health, nature, consciousness, spirituality, and holistic wellness. Write engaging, informative blog posts that are SEO-friendly and educational. Cover topics like natural remedies, mindfulness, nutrition, herbal medicine, sustainable living, and personal growth. Focus on scientific facts when available, practical applications, and inspiring content."
-        ).with_model("gemini", "gemini-2.0-flash-lite")
-        
-        user_message = UserMessage(
-            text=f"Write a comprehensive blog post about: {input.keywords}. Include an engaging title, detailed content with sections covering the main topic, benefits, scientific research (if applicable), practical applications, and important considerations. Make it around 800-1200 words. Format with proper headings using markdown. Be creative and informative."
-        )
-        
-        blog_content = await chat.send_message(user_message)
-        
-        # Extract title from content (first line)
-        lines = blog_content.strip().split('\n')
-        title = lines[0].replace('#', '').strip() if lines else input.keywords
-        content = '\n'.join(lines[1:]).strip() if len(lines) > 1 else blog_content
-        
-        # Fetch image from Pexels based on keywords
-        image_base64 = None
-        try:
-            pexels_key = os.environ.get('PEXELS_API_KEY')
-            if pexels_key:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        f"https://api.pexels.com/v1/search?query={input.keywords}&per_page=1",
-                        headers={"Authorization": pexels_key},
-                        timeout=10.0
-                    )
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get('photos') and len(data['photos']) > 0:
-                            image_url = data['photos'][0]['src']['medium']
-                            # Download image and convert to base64
-                            img_response = await client.get(image_url, timeout=10.0)
-                            if img_response.status_code == 200:
-                                image_base64 = f"data:image/jpeg;base64,{base64.b64encode(img_response.content).decode()}"
-        except Exception as img_error:
-            logging.warning(f"Failed to fetch image for blog generation: {str(img_error)}")
-        
-        return GenerateResponse(
-            title=title,
-            content=content,
-            image_base64=image_base64
-        )
+        job = await blog_generation.submit(input.keywords, force=force)
+        return generate_job_response(job)
     except Exception as e:
-        logging.error(f"Error generating blog: {str(e)}")
+        logging.error(f"Error starting blog generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate blog: {str(e)}")
 
+# Poll a blog generation job
+@api_router.get("/blogs/generate/{job_id}", response_model=GenerateJob)
+async def get_generation_job(job_id: str):
+    try:
+        job = await blog_generation.get(job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Generation job not found")
+        return generate_job_response(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error fetching generation job: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch generation job")
+
+# Stream a blog generation job as server-sent events (token, status, done, error)
+@api_router.get("/blogs/generate/{job_id}/stream")
+async def stream_generation_job(job_id: str):
+    if not await db.generation_jobs.find_one({"id": job_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Generation job not found")
+    return StreamingResponse(
+        blog_generation.events(job_id),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx must pass events through unbuffered
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # Upload image for blog
 @api_router.post("/blogs/{blog_id}/upload-image")
 async def upload_blog_image(blog_id: str, file: UploadFile = File(...)):
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Convert to base64 for storage
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        image_url = f"data:image/{file.content_type.split('/')[-1]};base64,{image_base64}"
+        # Store image in media store and reference it by hash
+        media = await media_store.save_upload(file)
+        image_pipeline.schedule(media["id"])
+        image_url = media_url(media["id"])
         
         # Update blog with image
         result = await db.blogs.update_one(
@@ -1202,8 +1272,11 @@ async def upload_blog_image(blog_id: str, file: UploadFile = File(...)):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Blog not found")
+        await blogs_changed()
         
         return {"success": True, "image_url": image_url}
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error uploading image: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload image")
@@ -1212,12 +1285,10 @@ async def upload_blog_image(blog_id: str, file: UploadFile = File(...)):
 @api_router.post("/products/{product_id}/upload-image")
 async def upload_product_image(product_id: str, file: UploadFile = File(...)):
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Convert to base64 for storage
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        image_url = f"data:image/{file.content_type.split('/')[-1]};base64,{image_base64}"
+        # Store image in media store and reference it by hash
+        media = await media_store.save_upload(file)
+        image_pipeline.schedule(media["id"])
+        image_url = media_url(media["id"])
         
         # Update product with image
         result = await db.products.update_one(
@@ -1227,6 +1298,8 @@ async def upload_product_image(product_id: str, file: UploadFile = File(...)):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Product not found")
+        await catalog.invalidate()
+        await refresh_auto_galleries()
         
         return {"success": True, "image_url": image_url}
     except HTTPException:
@@ -1239,14 +1312,10 @@ async def upload_product_image(product_id: str, file: UploadFile = File(...)):
 @api_router.post("/blogs/{blog_id}/upload-audio")
 async def upload_blog_audio(blog_id: str, file: UploadFile = File(...)):
     try:
-        # Read file content
-        contents = await file.read()
-        
-        # Convert to base64 for storage
-        audio_base64 = base64.b64encode(contents).decode('utf-8')
-        # Determine audio type
+        # Store audio in media store and reference it by hash
         content_type = file.content_type or 'audio/mpeg'
-        audio_url = f"data:{content_type};base64,{audio_base64}"
+        media = await media_store.save_upload(file, content_type)
+        audio_url = media_url(media["id"])
         
         # Update blog with audio
         result = await db.blogs.update_one(
@@ -1256,6 +1325,7 @@ async def upload_blog_audio(blog_id: str, file: UploadFile = File(...)):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Blog not found")
+        await blogs_changed()
         
         return {"success": True, "audio_url": audio_url}
     except HTTPException:
@@ -1264,53 +1334,102 @@ async def upload_blog_audio(blog_id: str, file: UploadFile = File(...)):
         logging.error(f"Error uploading audio: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to upload audio")
 
-# Fetch images from web based on keywords
-@api_router.get("/fetch-images")
-async def fetch_images_from_web(keywords: str, count: int = 3):
+# Serve stored media by content hash (supports Range requests for audio seeking)
+@api_router.api_route("/media/{media_id}", methods=["GET", "HEAD"])
+async def get_media(media_id: str, request: Request):
     try:
-        pexels_api_key = os.environ.get('PEXELS_API_KEY')
-        if not pexels_api_key:
-            raise HTTPException(status_code=500, detail="Pexels API key not configured")
+        info = await media_store.get_info(media_id)
+        if not info:
+            raise HTTPException(status_code=404, detail="Media not found")
         
-        # Search Pexels for relevant images
-        search_url = "https://api.pexels.com/v1/search"
+        # Content is addressed by its hash, so the hash is a strong ETag
+        # and the response never changes
+        etag = f'"{media_id}"'
         headers = {
-            "Authorization": pexels_api_key
-        }
-        params = {
-            "query": keywords,
-            "per_page": min(count, 5),  # Max 5 images
-            "orientation": "landscape"
+            "ETag": etag,
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "Accept-Ranges": "bytes"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(search_url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                image_urls = []
-                
-                # Download and convert each image to base64
-                for photo in data.get('photos', [])[:count]:
-                    try:
-                        # Use medium size image
-                        img_url = photo.get('src', {}).get('medium')
-                        if img_url:
-                            img_response = await client.get(img_url)
-                            if img_response.status_code == 200:
-                                image_base64 = base64.b64encode(img_response.content).decode('utf-8')
-                                image_data_url = f"data:image/jpeg;base64,{image_base64}"
-                                image_urls.append(image_data_url)
-                    except Exception as e:
-                        logging.error(f"Error downloading image: {str(e)}")
-                        continue
-                
-                if image_urls:
-                    return {"success": True, "image_urls": image_urls}
-                else:
-                    raise HTTPException(status_code=404, detail="No images found")
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch from Pexels")
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        
+        size = info["size"]
+        start, end = 0, size - 1
+        status_code = 200
+        
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and size > 0 and (not if_range or if_range.strip() == etag):
+            try:
+                byte_range = parse_range_header(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        
+        headers["Content-Length"] = str(end - start + 1 if size > 0 else 0)
+        
+        if request.method == "HEAD" or size == 0:
+            return Response(status_code=status_code, headers=headers, media_type=info["content_type"])
+        
+        return StreamingResponse(
+            media_store.iter_range(media_id, start, end),
+            status_code=status_code,
+            headers=headers,
+            media_type=info["content_type"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error serving media: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to serve media")
+
+# Responsive variants of a stored image (srcset map per format)
+@api_router.get("/media/{media_id}/srcset")
+async def get_media_srcset(media_id: str):
+    try:
+        info = await media_store.get_info(media_id)
+        if not info:
+            raise HTTPException(status_code=404, detail="Media not found")
+        
+        # Render on demand for images stored before the pipeline existed
+        if "derivatives" not in info and info["content_type"].startswith("image/"):
+            info = await image_pipeline.generate(media_id)
+        
+        return {
+            "id": media_id,
+            "url": media_url(media_id),
+            "width": info.get("width"),
+            "height": info.get("height"),
+            "srcset": build_srcset(info),
+            "sizes": {
+                content_type: {width: media_url(variant_id) for width, variant_id in by_width.items()}
+                for content_type, by_width in (info.get("derivatives") or {}).items()
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error building srcset: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to build srcset")
+
+# Fetch images from web based on keywords
+@api_router.get("/fetch-images")
+async def fetch_images_from_web(keywords: str, count: int = 3):
+    try:
+        # Max 5 images, downloaded concurrently into the media store
+        image_urls = await pexels.fetch_images(keywords, min(count, 5), orientation="landscape")
+        if not image_urls:
+            raise HTTPException(status_code=404, detail="No images found")
+        return {"success": True, "image_urls": image_urls}
+    except HTTPException:
+        raise
+    except PexelsError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logging.error(f"Error fetching images from web: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch images from web: {str(e)}")
@@ -1320,45 +1439,14 @@ async def fetch_images_from_web(keywords: str, count: int = 3):
 @api_router.get("/fetch-image")
 async def fetch_single_image_from_web(keywords: str = "nature"):
     try:
-        pexels_api_key = os.environ.get('PEXELS_API_KEY')
-        if not pexels_api_key:
-            raise HTTPException(status_code=500, detail="Pexels API key not configured")
-        
-        # Search Pexels for one image
-        search_url = "https://api.pexels.com/v1/search"
-        headers = {
-            "Authorization": pexels_api_key
-        }
-        params = {
-            "query": keywords,
-            "per_page": 1,
-            "orientation": "landscape"
-        }
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(search_url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                photos = data.get('photos', [])
-                
-                if photos:
-                    photo = photos[0]
-                    img_url = photo.get('src', {}).get('medium')
-                    
-                    if img_url:
-                        # Download and convert to base64
-                        img_response = await client.get(img_url)
-                        if img_response.status_code == 200:
-                            image_base64 = base64.b64encode(img_response.content).decode('utf-8')
-                            image_data_url = f"data:image/jpeg;base64,{image_base64}"
-                            return {"success": True, "image_url": image_data_url}
-                
-                raise HTTPException(status_code=404, detail="No image found")
-            else:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch from Pexels")
+        image_urls = await pexels.fetch_images(keywords, 1, orientation="landscape")
+        if not image_urls:
+            raise HTTPException(status_code=404, detail="No image found")
+        return {"success": True, "image_url": image_urls[0]}
     except HTTPException:
         raise
+    except PexelsError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         logging.error(f"Error fetching image from web: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch image from web: {str(e)}")
@@ -1367,12 +1455,12 @@ async def fetch_single_image_from_web(keywords: str = "nature"):
 @api_router.post("/blogs", response_model=BlogPost)
 async def create_blog(blog: BlogPost):
     try:
+        if blog.status == "published" and blog.published_at is None:
+            # "Save & publish" creates the post already published
+            blog.published_at = datetime.now(timezone.utc)
         doc = blog.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        if doc['published_at']:
-            doc['published_at'] = doc['published_at'].isoformat()
-        
         await db.blogs.insert_one(doc)
+        await blogs_changed()
         return blog
     except Exception as e:
         logging.error(f"Error creating blog: {str(e)}")
@@ -1380,36 +1468,129 @@ async def create_blog(blog: BlogPost):
 
 # Get all published blogs (public)
 @api_router.get("/blogs", response_model=List[BlogPost])
-async def get_blogs(status: Optional[str] = "published"):
+async def get_blogs(request: Request, status: Optional[str] = "published"):
+    try:
+        await blogs_version.refresh()
+        headers = validator_headers(make_etag("blogs", blogs_version.seen, status), blogs_version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        
+        query = {"status": status} if status else {}
+        blogs = await db.blogs.find(query, BLOG_PROJECTION).sort("created_at", -1).to_list(1000)
+        return FastJSONResponse(blogs, headers=headers)
+    except Exception as e:
+        logging.error(f"Error fetching blogs: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch blogs")
+
+# Keyset pagination cursors: opaque base64url of [sort value, id]
+# Dates are tagged as {"$date": iso} so they decode back to datetimes
+def encode_cursor(values: list) -> str:
+    values = [{"$date": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list):
+            raise ValueError("cursor is not a list")
+        return [as_datetime(v["$date"]) if isinstance(v, dict) and "$date" in v else v for v in values]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def make_excerpt(text: Optional[str], length: int = 200) -> str:
+    # Strip markdown markup and cut at a word boundary
+    plain = re.sub(r"[#*_>`\[\]]", "", text or "")
+    plain = re.sub(r"\s+", " ", plain).strip()
+    if len(plain) <= length:
+        return plain
+    return plain[:length].rsplit(" ", 1)[0] + "…"
+
+def _not_data_url(expr):
+    # Mongo expression: null out embedded data: URLs so they never leave the DB
+    return {"$cond": [{"$eq": [{"$substrCP": [{"$ifNull": [expr, ""]}, 0, 5]}, "data:"]}, None, expr]}
+
+# Get blog summaries (lightweight list for the blog index)
+@api_router.get("/blogs/summary", response_model=BlogSummaryPage)
+async def get_blog_summaries(
+    status: Optional[str] = "published",
+    limit: int = Query(12, ge=1, le=50),
+    cursor: Optional[str] = None
+):
     try:
+        # Published posts page by publish date, drafts by creation date
+        sort_field = "published_at" if status == "published" else "created_at"
         query = {"status": status} if status else {}
-        blogs = await db.blogs.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
         
+        if cursor:
+            last_value, last_id = (decode_cursor(cursor) + [None, None])[:2]
+            query.update(keyset_before(sort_field, last_value, last_id))
+        
+        pipeline = [
+            {"$match": query},
+            {"$sort": {sort_field: -1, "id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {
+                "_id": 0,
+                "id": 1,
+                "title": 1,
+                "created_at": 1,
+                "published_at": 1,
+                # Only the head of the post body is needed for the excerpt
+                "content_head": {"$substrCP": [{"$ifNull": ["$content", ""]}, 0, 400]},
+                "first_image": _not_data_url({"$arrayElemAt": [{"$ifNull": ["$image_urls", []]}, 0]}),
+                "image_url": _not_data_url("$image_url")
+            }}
+        ]
+        blogs = await db.blogs.aggregate(pipeline).to_list(limit + 1)
+        
+        next_cursor = None
+        if len(blogs) > limit:
+            blogs = blogs[:limit]
+            last = blogs[-1]
+            next_cursor = encode_cursor([last.get(sort_field), last["id"]])
+        
+        # Resolve responsive variants for all thumbnails with one query
+        thumbnails = {blog["id"]: blog.get("image_url") or blog.get("first_image") for blog in blogs}
+        media_ids = [url[len(MEDIA_URL_PREFIX):] for url in thumbnails.values() if url and url.startswith(MEDIA_URL_PREFIX)]
+        media_docs = {}
+        if media_ids:
+            async for doc in db.media.find({"id": {"$in": media_ids}}, {"_id": 0, "id": 1, "derivatives": 1}):
+                media_docs[doc["id"]] = doc
+        
+        items = []
         for blog in blogs:
-            if isinstance(blog.get('created_at'), str):
-                blog['created_at'] = datetime.fromisoformat(blog['created_at'])
-            if blog.get('published_at') and isinstance(blog['published_at'], str):
-                blog['published_at'] = datetime.fromisoformat(blog['published_at'])
+            thumbnail = thumbnails[blog["id"]]
+            media_doc = media_docs.get(thumbnail[len(MEDIA_URL_PREFIX):]) if thumbnail and thumbnail.startswith(MEDIA_URL_PREFIX) else None
+            items.append({
+                "id": blog["id"],
+                "title": blog.get("title", ""),
+                "excerpt": make_excerpt(blog.get("content_head")),
+                "thumbnail_url": thumbnail,
+                "thumbnail_srcset": build_srcset(media_doc) if media_doc else None,
+                "created_at": blog.get("created_at"),
+                "published_at": blog.get("published_at")
+            })
         
-        return blogs
+        return {"items": items, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error fetching blogs: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to fetch blogs")
+        logging.error(f"Error fetching blog summaries: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch blog summaries")
 
 # Get single blog
 @api_router.get("/blogs/{blog_id}", response_model=BlogPost)
-async def get_blog(blog_id: str):
+async def get_blog(request: Request, blog_id: str):
     try:
-        blog = await db.blogs.find_one({"id": blog_id}, {"_id": 0})
+        await blogs_version.refresh()
+        headers = validator_headers(make_etag("blog", blogs_version.seen, blog_id), blogs_version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        
+        blog = await db.blogs.find_one({"id": blog_id}, BLOG_PROJECTION)
         if not blog:
             raise HTTPException(status_code=404, detail="Blog not found")
-        
-        if isinstance(blog.get('created_at'), str):
-            blog['created_at'] = datetime.fromisoformat(blog['created_at'])
-        if blog.get('published_at') and isinstance(blog['published_at'], str):
-            blog['published_at'] = datetime.fromisoformat(blog['published_at'])
-        
-        return blog
+        return FastJSONResponse(blog, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -1432,15 +1613,16 @@ async def update_blog(blog_id: str, update: BlogPostUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Blog not found")
+        if update_data.get("status") == "published":
+            # Published through an edit: stamp it once, keep an existing date
+            await db.blogs.update_one(
+                {"id": blog_id, "status": "published", "published_at": None},
+                {"$set": {"published_at": datetime.now(timezone.utc)}}
+            )
+        await blogs_changed()
         
-        blog = await db.blogs.find_one({"id": blog_id}, {"_id": 0})
-        
-        if isinstance(blog.get('created_at'), str):
-            blog['created_at'] = datetime.fromisoformat(blog['created_at'])
-        if blog.get('published_at') and isinstance(blog['published_at'], str):
-            blog['published_at'] = datetime.fromisoformat(blog['published_at'])
-        
-        return blog
+        blog = await db.blogs.find_one({"id": blog_id}, BLOG_PROJECTION)
+        return FastJSONResponse(blog)
     except HTTPException:
         raise
     except Exception as e:
@@ -1455,12 +1637,13 @@ async def publish_blog(blog_id: str):
             {"id": blog_id},
             {"$set": {
                 "status": "published",
-                "published_at": datetime.now(timezone.utc).isoformat()
+                "published_at": datetime.now(timezone.utc)
             }}
         )
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Blog not found")
+        await blogs_changed()
         
         return {"success": True, "message": "Blog published successfully"}
     except HTTPException:
@@ -1477,6 +1660,7 @@ async def delete_blog(blog_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Blog not found")
+        await blogs_changed()
         
         return {"success": True, "message": "Blog deleted successfully"}
     except HTTPException:
@@ -1491,7 +1675,7 @@ async def delete_blog(blog_id: str):
 @api_router.post("/shop/create-order")
 async def create_shop_order(order: CreateOrder):
     try:
-        if not os.environ.get('PAYPAL_CLIENT_ID'):
+        if not paypal.configured:
             raise HTTPException(status_code=500, detail="PayPal not configured. Please add PAYPAL_CLIENT_ID and PAYPAL_CLIENT_SECRET to .env file")
         
         # Validate and apply coupon if provided
@@ -1537,7 +1721,7 @@ async def create_shop_order(order: CreateOrder):
                 "quantity": item.quantity
             })
         
-        payment = paypalrestsdk.Payment({
+        payment_request = {
             "intent": "sale",
             "payer": {
                 "payment_method": "paypal"
@@ -1556,39 +1740,43 @@ async def create_shop_order(order: CreateOrder):
                 },
                 "description": "ApeBrain.cloud Shop Purchase"
             }]
-        })
+        }
 
-        if payment.create():
+        try:
+            payment = await paypal.create_payment(payment_request)
+        except PayPalTimeout as e:
+            logging.error(f"PayPal payment creation timed out: {str(e)}")
+            raise HTTPException(status_code=504, detail=str(e))
+        except PayPalError as e:
+            logging.error(f"PayPal payment creation failed: {e.details or str(e)}")
+            raise HTTPException(status_code=400, detail=f"Payment creation failed: {e.details or str(e)}")
+
+        if payment.get("state") == "created":
             # Save order to database
             order_doc = {
                 "id": str(uuid.uuid4()),
-                "payment_id": payment.id,
+                "payment_id": payment["id"],
                 "items": [item.dict() for item in order.items],
                 "total": order.total,
                 "customer_email": order.customer_email,
                 "coupon_code": order.coupon_code,
                 "discount_amount": round(discount_amount, 2),
                 "status": "pending",
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             }
             await db.orders.insert_one(order_doc)
-            
-            # Get approval URL
-            approval_url = None
-            for link in payment.links:
-                if link.rel == "approval_url":
-                    approval_url = link.href
-                    break
+            await order_stats.record(None, order_doc)
+            await order_events.emit("order_created", order_doc["id"], order_doc)
             
             return {
                 "success": True,
-                "approval_url": approval_url,
+                "approval_url": approval_url(payment),
                 "order_id": order_doc["id"],
-                "payment_id": payment.id
+                "payment_id": payment["id"]
             }
         else:
-            logging.error(f"PayPal payment creation failed: {payment.error}")
-            raise HTTPException(status_code=400, detail=f"Payment creation failed: {payment.error}")
+            logging.error(f"PayPal payment creation failed: unexpected state {payment.get('state')}")
+            raise HTTPException(status_code=400, detail=f"Payment creation failed: state {payment.get('state')}")
     
     except HTTPException:
         raise
@@ -1600,30 +1788,40 @@ async def create_shop_order(order: CreateOrder):
 @api_router.post("/shop/execute-payment")
 async def execute_payment(payment_id: str, payer_id: str):
     try:
-        payment = paypalrestsdk.Payment.find(payment_id)
-        
-        if payment.execute({"payer_id": payer_id}):
+        try:
+            payment = await paypal.execute_payment(payment_id, payer_id)
+        except PayPalTimeout as e:
+            logging.error(f"PayPal payment execution timed out: {str(e)}")
+            raise HTTPException(status_code=504, detail=str(e))
+        except PayPalError as e:
+            logging.error(f"Payment execution failed: {e.details or str(e)}")
+            raise HTTPException(status_code=400, detail=f"Payment execution failed: {e.details or str(e)}")
+        
+        if payment.get("state") == "approved":
             # Update order status to 'paid'
-            completed_time = datetime.now(timezone.utc).isoformat()
-            result = await db.orders.update_one(
+            update_data = {
+                "status": "paid",
+                "payer_id": payer_id,
+                "completed_at": datetime.now(timezone.utc)
+            }
+            previous = await db.orders.find_one_and_update(
                 {"payment_id": payment_id},
-                {"$set": {
-                    "status": "paid",
-                    "payer_id": payer_id,
-                    "completed_at": completed_time
-                }}
+                {"$set": update_data},
+                return_document=ReturnDocument.BEFORE
             )
             
-            if result.matched_count == 0:
+            if previous is None:
                 logging.warning(f"Order not found for payment_id: {payment_id}")
             else:
-                # Get order data and send notifications
-                order = await db.orders.find_one({"payment_id": payment_id})
-                if order:
-                    # Send admin notification
-                    await send_order_notification(order)
-                    # Send customer confirmation
-                    await send_customer_notification(order, 'paid')
+                # Order data for the counters and notifications
+                order = {**previous, **update_data}
+                await order_stats.record(previous, order)
+                await order_analytics.record(previous, order)
+                await order_events.emit("order_paid", order["id"], order)
+                # Send admin notification
+                await send_order_notification(order)
+                # Send customer confirmation
+                await send_customer_notification(order, 'paid')
             
             return {
                 "success": True,
@@ -1631,8 +1829,8 @@ async def execute_payment(payment_id: str, payer_id: str):
                 "payment_id": payment_id
             }
         else:
-            logging.error(f"Payment execution failed: {payment.error}")
-            raise HTTPException(status_code=400, detail=f"Payment execution failed: {payment.error}")
+            logging.error(f"Payment execution failed: unexpected state {payment.get('state')}")
+            raise HTTPException(status_code=400, detail=f"Payment execution failed: state {payment.get('state')}")
     
     except HTTPException:
         raise
@@ -1640,6 +1838,24 @@ async def execute_payment(payment_id: str, payer_id: str):
         logging.error(f"Error executing payment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to execute payment: {str(e)}")
 
+# Live order events for the admin UI (Server-Sent Events)
+@api_router.get("/orders/events")
+async def order_event_stream():
+    return StreamingResponse(
+        order_events.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Order counters: total, unviewed, per status and revenue (admin)
+@api_router.get("/orders/stats")
+async def get_order_stats():
+    try:
+        return await order_stats.read()
+    except Exception as e:
+        logging.error(f"Error reading order stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to read order stats")
+
 # Get order details
 @api_router.get("/orders/{order_id}")
 async def get_order(order_id: str):
@@ -1654,22 +1870,66 @@ async def get_order(order_id: str):
         logging.error(f"Error fetching order: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch order")
 
-# Get all orders (admin)
+# Fields the admin order list may project
+ORDER_LIST_FIELDS = set(Order.model_fields) | {"payer_id"}
+
+# Get all orders (admin) - filterable, keyset-paginated
 @api_router.get("/orders")
-async def get_all_orders():
+async def get_all_orders(
+    status: Optional[str] = None,
+    email: Optional[str] = None,
+    viewed: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
     try:
-        orders = await db.orders.find().sort("created_at", -1).to_list(length=None)
-        
-        # Convert datetime to ISO string for JSON serialization
-        for order in orders:
-            if '_id' in order:
-                del order['_id']
-            if isinstance(order.get('created_at'), datetime):
-                order['created_at'] = order['created_at'].isoformat()
-            if isinstance(order.get('completed_at'), datetime):
-                order['completed_at'] = order['completed_at'].isoformat()
-        
-        return orders
+        query = {}
+        if status:
+            statuses = [s.strip() for s in status.split(",") if s.strip()]
+            query["status"] = statuses[0] if len(statuses) == 1 else {"$in": statuses}
+        if email:
+            query["customer_email"] = email
+        if viewed is not None:
+            # Older orders have no viewed flag at all
+            query["viewed"] = True if viewed else {"$in": [False, None]}
+        if created_from or created_to:
+            # Naive bounds are taken as UTC
+            bounds = {}
+            if created_from:
+                bounds["gte"] = as_datetime(created_from)
+            if created_to:
+                bounds["lte"] = as_datetime(created_to)
+            query.update(range_query("created_at", **bounds))
+        
+        projection = {"_id": 0}
+        if fields:
+            requested = {f.strip() for f in fields.split(",") if f.strip()}
+            unknown = requested - ORDER_LIST_FIELDS
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+            projection.update({f: 1 for f in requested | {"id", "created_at"}})
+        
+        # Total uses the same filter (without the cursor) and the same indexes
+        total = await db.orders.count_documents(query)
+        
+        page_query = dict(query)
+        if cursor:
+            last_created_at, last_id = (decode_cursor(cursor) + [None, None])[:2]
+            page_query = {"$and": [query, keyset_before("created_at", last_created_at, last_id)]}
+        
+        orders = await db.orders.find(page_query, projection).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor([orders[-1].get("created_at"), orders[-1].get("id")])
+        
+        return FastJSONResponse({"items": orders, "total": total, "next_cursor": next_cursor})
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching orders: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch orders")
@@ -1678,13 +1938,17 @@ async def get_all_orders():
 @api_router.post("/orders/{order_id}/mark-viewed")
 async def mark_order_viewed(order_id: str):
     try:
-        result = await db.orders.update_one(
+        previous = await db.orders.find_one_and_update(
             {"id": order_id},
-            {"$set": {"viewed": True}}
+            {"$set": {"viewed": True}},
+            projection=STATS_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        await order_stats.record(previous, {**previous, "viewed": True})
+        await order_events.emit("order_viewed", order_id)
         
         return {"success": True}
     except HTTPException:
@@ -1699,13 +1963,17 @@ async def mark_order_viewed(order_id: str):
 async def mark_order_viewed_alias(order_id: str):
     """Alias for /orders/{order_id}/mark-viewed for convenience"""
     try:
-        result = await db.orders.update_one(
+        previous = await db.orders.find_one_and_update(
             {"id": order_id},
-            {"$set": {"viewed": True}}
+            {"$set": {"viewed": True}},
+            projection=STATS_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        await order_stats.record(previous, {**previous, "viewed": True})
+        await order_events.emit("order_viewed", order_id)
         
         return {"success": True}
     except HTTPException:
@@ -1718,8 +1986,7 @@ async def mark_order_viewed_alias(order_id: str):
 @api_router.get("/orders/unviewed/count")
 async def get_unviewed_count():
     try:
-        count = await db.orders.count_documents({"viewed": {"$ne": True}, "status": "completed"})
-        return {"count": count}
+        return {"count": await order_stats.unviewed()}
     except Exception as e:
         logging.error(f"Error counting unviewed orders: {str(e)}")
         return {"count": 0}
@@ -1728,10 +1995,13 @@ async def get_unviewed_count():
 @api_router.delete("/orders/{order_id}")
 async def delete_order(order_id: str):
     try:
-        result = await db.orders.delete_one({"id": order_id})
+        previous = await db.orders.find_one_and_delete({"id": order_id}, projection=ORDER_CHANGE_PROJECTION)
         
-        if result.deleted_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        await order_stats.record(previous, None)
+        await order_analytics.record(previous, None)
+        await order_events.emit("order_deleted", order_id)
         
         return {"success": True, "message": "Order deleted successfully"}
     except HTTPException:
@@ -1751,17 +2021,22 @@ async def update_order_status(order_id: str, status: str):
         
         # Set timestamp based on status
         if status == "shipped":
-            update_data["shipped_at"] = datetime.now(timezone.utc).isoformat()
+            update_data["shipped_at"] = datetime.now(timezone.utc)
         elif status == "delivered":
-            update_data["delivered_at"] = datetime.now(timezone.utc).isoformat()
+            update_data["delivered_at"] = datetime.now(timezone.utc)
         
-        result = await db.orders.update_one(
+        previous = await db.orders.find_one_and_update(
             {"id": order_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection=ORDER_CHANGE_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        await order_stats.record(previous, {**previous, **update_data})
+        await order_analytics.record(previous, {**previous, **update_data})
+        await order_events.emit("order_status_changed", order_id)
         
         # Send customer notification for certain status changes
         if status in ["shipped", "delivered"]:
@@ -1792,19 +2067,25 @@ async def update_order_tracking(order_id: str, tracking_number: str, shipping_ca
         # Generate tracking URL
         tracking_url = generate_tracking_url(shipping_carrier, tracking_number)
         
-        result = await db.orders.update_one(
+        update_data = {
+            "tracking_number": tracking_number,
+            "shipping_carrier": shipping_carrier,
+            "tracking_url": tracking_url,
+            "status": "shipped",
+            "shipped_at": datetime.now(timezone.utc)
+        }
+        previous = await db.orders.find_one_and_update(
             {"id": order_id},
-            {"$set": {
-                "tracking_number": tracking_number,
-                "shipping_carrier": shipping_carrier,
-                "tracking_url": tracking_url,
-                "status": "shipped",
-                "shipped_at": datetime.now(timezone.utc).isoformat()
-            }}
+            {"$set": update_data},
+            projection=ORDER_CHANGE_PROJECTION,
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        await order_stats.record(previous, {**previous, **update_data})
+        await order_analytics.record(previous, {**previous, **update_data})
+        await order_events.emit("order_status_changed", order_id)
         
         # Send shipping notification to customer
         order = await db.orders.find_one({"id": order_id})
@@ -1830,14 +2111,6 @@ async def track_order(order_id: str, email: str):
         # Remove sensitive data
         if '_id' in order:
             del order['_id']
-        if isinstance(order.get('created_at'), datetime):
-            order['created_at'] = order['created_at'].isoformat()
-        if isinstance(order.get('completed_at'), datetime):
-            order['completed_at'] = order['completed_at'].isoformat()
-        if isinstance(order.get('shipped_at'), datetime):
-            order['shipped_at'] = order['shipped_at'].isoformat()
-        if isinstance(order.get('delivered_at'), datetime):
-            order['delivered_at'] = order['delivered_at'].isoformat()
         
         return order
     except HTTPException:
@@ -1850,15 +2123,15 @@ async def track_order(order_id: str, email: str):
 
 # Get active coupon (public)
 @api_router.get("/coupons/active")
-async def get_active_coupon():
+async def get_active_coupon(request: Request):
     try:
+        await coupons_version.refresh()
+        headers = validator_headers(make_etag("active_coupon", coupons_version.seen), coupons_version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        
         coupon = await db.coupons.find_one({"is_active": True}, {"_id": 0})
-        if coupon:
-            if isinstance(coupon.get('created_at'), str):
-                coupon['created_at'] = datetime.fromisoformat(coupon['created_at'])
-            if coupon.get('expires_at') and isinstance(coupon['expires_at'], str):
-                coupon['expires_at'] = datetime.fromisoformat(coupon['expires_at'])
-        return coupon
+        return FastJSONResponse(coupon, headers=headers)
     except Exception as e:
         logging.error(f"Error fetching active coupon: {str(e)}")
         return None
@@ -1874,8 +2147,7 @@ async def validate_coupon(request: CouponValidate):
         
         # Check expiration
         if coupon.get('expires_at'):
-            expires = datetime.fromisoformat(coupon['expires_at']) if isinstance(coupon['expires_at'], str) else coupon['expires_at']
-            if expires < datetime.now(timezone.utc):
+            if as_datetime(coupon['expires_at']) < datetime.now(timezone.utc):
                 raise HTTPException(status_code=400, detail="Coupon has expired")
         
         # Calculate discount
@@ -1916,11 +2188,12 @@ async def create_coupon(coupon: CouponCreate):
             "discount_type": coupon.discount_type,
             "discount_value": coupon.discount_value,
             "is_active": coupon.is_active,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "expires_at": coupon.expires_at.isoformat() if coupon.expires_at else None
+            "created_at": datetime.now(timezone.utc),
+            "expires_at": coupon.expires_at
         }
         
         await db.coupons.insert_one(doc)
+        await coupons_version.bump()
         
         # Return without MongoDB _id
         return {
@@ -1943,12 +2216,7 @@ async def create_coupon(coupon: CouponCreate):
 async def get_all_coupons():
     try:
         coupons = await db.coupons.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-        for coupon in coupons:
-            if isinstance(coupon.get('created_at'), str):
-                coupon['created_at'] = datetime.fromisoformat(coupon['created_at'])
-            if coupon.get('expires_at') and isinstance(coupon['expires_at'], str):
-                coupon['expires_at'] = datetime.fromisoformat(coupon['expires_at'])
-        return coupons
+        return FastJSONResponse(coupons)
     except Exception as e:
         logging.error(f"Error fetching coupons: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch coupons")
@@ -1969,10 +2237,6 @@ async def update_coupon(coupon_id: str, update: CouponUpdate):
             if existing:
                 raise HTTPException(status_code=400, detail="Coupon code already exists")
         
-        # Convert datetime to string if present
-        if 'expires_at' in update_data and update_data['expires_at']:
-            update_data['expires_at'] = update_data['expires_at'].isoformat()
-        
         result = await db.coupons.update_one(
             {"id": coupon_id},
             {"$set": update_data}
@@ -1980,6 +2244,7 @@ async def update_coupon(coupon_id: str, update: CouponUpdate):
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Coupon not found")
+        await coupons_version.bump()
         
         coupon = await db.coupons.find_one({"id": coupon_id}, {"_id": 0})
         return coupon
@@ -1997,6 +2262,7 @@ async def delete_coupon(coupon_id: str):
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Coupon not found")
+        await coupons_version.bump()
         
         return {"success": True, "message": "Coupon deleted successfully"}
     except HTTPException:
@@ -2007,31 +2273,37 @@ async def delete_coupon(coupon_id: str):
 
 # ============= PRODUCT MANAGEMENT ENDPOINTS =============
 
-# Get all products
+# Built-in products, shown unless a database product has the same id
+DEFAULT_PRODUCTS = [
+    {"id": "phys-1", "name": "Lion's Mane Extract", "price": 29.99, "description": "Premium quality Lion's Mane mushroom extract for cognitive support", "category": "Supplements", "type": "physical"},
+    {"id": "phys-2", "name": "Reishi Capsules", "price": 24.99, "description": "Pure Reishi mushroom capsules for immune system support", "category": "Supplements", "type": "physical"},
+    {"id": "phys-3", "name": "Mushroom Growing Kit", "price": 49.99, "description": "Complete kit to grow your own gourmet mushrooms at home", "category": "Kits", "type": "physical"},
+    {"id": "phys-4", "name": "Cordyceps Powder", "price": 34.99, "description": "Organic Cordyceps mushroom powder for energy and vitality", "category": "Supplements", "type": "physical"},
+    {"id": "digi-1", "name": "Mushroom Identification Guide", "price": 19.99, "description": "Comprehensive digital guide to identifying edible mushrooms", "category": "eBooks", "type": "digital"},
+    {"id": "digi-2", "name": "Holistic Health Course", "price": 79.99, "description": "Complete online course on natural wellness and mushroom medicine", "category": "Courses", "type": "digital"},
+    {"id": "digi-3", "name": "Meditation & Consciousness Pack", "price": 29.99, "description": "Guided meditations and consciousness expansion exercises", "category": "Audio", "type": "digital"}
+]
+
+# Product catalog held in memory (see catalog.py)
+catalog = ProductCatalog(db, DEFAULT_PRODUCTS)
+
+# Get all products - optionally filtered by category and/or type
 @api_router.get("/products")
-async def get_products():
-    try:
-        # For now, return hardcoded products (can be made dynamic later)
-        products = [
-            {"id": "phys-1", "name": "Lion's Mane Extract", "price": 29.99, "description": "Premium quality Lion's Mane mushroom extract for cognitive support", "category": "Supplements", "type": "physical"},
-            {"id": "phys-2", "name": "Reishi Capsules", "price": 24.99, "description": "Pure Reishi mushroom capsules for immune system support", "category": "Supplements", "type": "physical"},
-            {"id": "phys-3", "name": "Mushroom Growing Kit", "price": 49.99, "description": "Complete kit to grow your own gourmet mushrooms at home", "category": "Kits", "type": "physical"},
-            {"id": "phys-4", "name": "Cordyceps Powder", "price": 34.99, "description": "Organic Cordyceps mushroom powder for energy and vitality", "category": "Supplements", "type": "physical"},
-            {"id": "digi-1", "name": "Mushroom Identification Guide", "price": 19.99, "description": "Comprehensive digital guide to identifying edible mushrooms", "category": "eBooks", "type": "digital"},
-            {"id": "digi-2", "name": "Holistic Health Course", "price": 79.99, "description": "Complete online course on natural wellness and mushroom medicine", "category": "Courses", "type": "digital"},
-            {"id": "digi-3", "name": "Meditation & Consciousness Pack", "price": 29.99, "description": "Guided meditations and consciousness expansion exercises", "category": "Audio", "type": "digital"}
-        ]
-        
-        # Also get from database
-        db_products = await db.products.find({}, {"_id": 0}).to_list(1000)
-        
-        # Merge with hardcoded (avoid duplicates by ID)
-        existing_ids = [p["id"] for p in db_products]
-        for prod in products:
-            if prod["id"] not in existing_ids:
-                db_products.append(prod)
-        
-        return db_products
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    product_type: Optional[str] = Query(None, alias="type")
+):
+    try:
+        await catalog.ensure_fresh()
+        headers = validator_headers(make_etag("products", catalog.version.seen, category, product_type), catalog.version.modified)
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        if category is None and product_type is None:
+            return Response(content=await catalog.response_body(), media_type="application/json", headers=headers)
+        response.headers.update(headers)
+        return await catalog.list(category=category, product_type=product_type)
     except Exception as e:
         logging.error(f"Error fetching products: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch products")
@@ -2045,6 +2317,8 @@ async def create_product(product: dict):
             del product["_id"]
         
         await db.products.insert_one(product)
+        await catalog.invalidate()
+        await refresh_auto_galleries()
         
         # Return without MongoDB _id
         return {k: v for k, v in product.items() if k != "_id"}
@@ -2062,6 +2336,8 @@ async def update_product(product_id: str, product: dict):
         )
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Product not found")
+        await catalog.invalidate()
+        await refresh_auto_galleries()
         return product
     except HTTPException:
         raise
@@ -2076,6 +2352,8 @@ async def delete_product(product_id: str):
         result = await db.products.delete_one({"id": product_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Product not found")
+        await catalog.invalidate()
+        await refresh_auto_galleries()
         return {"success": True, "message": "Product deleted successfully"}
     except HTTPException:
         raise
@@ -2101,6 +2379,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_indexes():
+    started = time.monotonic()
+    await ensure_indexes()
+    logger.info(f"Index bootstrap finished in {(time.monotonic() - started) * 1000:.0f} ms")
+
+@app.on_event("startup")
+async def startup_migration_state():
+    await load_migration_state(db)
+
+@app.on_event("startup")
+async def startup_auto_galleries():
+    # Fills the galleries for data written before they were precomputed
+    await refresh_auto_galleries()
+
+@app.on_event("startup")
+async def startup_email_outbox():
+    email_outbox.start()
+
+@app.on_event("startup")
+async def startup_order_analytics():
+    # Backfills the rollups for orders placed before they were maintained
+    order_analytics.start()
+
+@app.on_event("startup")
+async def startup_order_stats():
+    order_stats.start()
+
+@app.on_event("startup")
+async def startup_order_events():
+    order_events.start()
+
+@app.on_event("startup")
+async def startup_google_keys():
+    if os.environ.get('GOOGLE_CLIENT_ID'):
+        google_keys.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await email_outbox.stop()
+    await order_events.stop()
+    await order_stats.stop()
+    await order_analytics.stop()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
+    await paypal.close()
+    await google_keys.stop()
+    await blog_generation.shutdown()
+    await pexels.close()
     client.close()
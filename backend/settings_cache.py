@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+from cache_version import VersionCounter
+
+# Read-through cache for admin-managed configuration (landing page, blog
+# features, color profiles). Values are loaded on first use and kept in
+# memory until an admin write bumps the shared `settings_version` counter,
+# which every other worker notices on its next poll (see cache_version.py).
+
+
+class SettingsCache:
+    def __init__(self, db):
+        self.db = db
+        self.version = VersionCounter(db, "settings_version")
+        self._entries = {}
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+    async def get(self, key: str, loader):
+        """Cached value for `key`, awaiting `loader()` on a miss."""
+        if await self.version.check() is not None:
+            self._entries.clear()
+        if key in self._entries:
+            self.stats["hits"] += 1
+            return self._entries[key]
+        async with self._lock:
+            if key not in self._entries:
+                self._entries[key] = await loader()
+                self.stats["loads"] += 1
+            return self._entries[key]
+
+    async def invalidate(self):
+        """Call after every write to cached settings."""
+        version = await self.version.bump()
+        self._entries.clear()
+        self.stats["invalidations"] += 1
+        logging.info(f"Settings cache invalidated (version {version})")
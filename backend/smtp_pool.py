@@ -0,0 +1,91 @@
+import time
+import asyncio
+import logging
+
+import aiosmtplib
+
+# Pool of authenticated SMTP connections.
+# Opening a connection costs TCP + STARTTLS + AUTH round trips; keeping a few
+# logged-in clients around lets a batch of notifications reuse one handshake.
+# Connections that the server dropped are replaced transparently.
+
+RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class SMTPConnectionPool:
+    def __init__(self, hostname: str, port: int, username: str, password: str, start_tls: bool = True,
+                 size: int = 2, idle_timeout: float = 60.0, max_messages: int = 100, timeout: float = 30.0):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle = []  # (client, last_used, messages_sent)
+        self._slots = asyncio.Semaphore(size)
+        self.stats = {"connects": 0, "messages": 0, "reconnects": 0}
+
+    async def _connect(self):
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        await client.connect()
+        self.stats["connects"] += 1
+        return client, 0
+
+    async def _close(self, client):
+        try:
+            if client.is_connected:
+                await client.quit()
+        except Exception:
+            client.close()
+
+    async def _acquire(self):
+        while self._idle:
+            client, last_used, sent = self._idle.pop()
+            if client.is_connected and time.monotonic() - last_used < self.idle_timeout and sent < self.max_messages:
+                return client, sent
+            await self._close(client)
+        return await self._connect()
+
+    def _release(self, client, sent):
+        if client.is_connected:
+            self._idle.append((client, time.monotonic(), sent))
+
+    async def send(self, message):
+        """Send a message over a pooled connection, reconnecting once if it was dropped."""
+        async with self._slots:
+            client, sent = await self._acquire()
+            try:
+                try:
+                    await client.send_message(message)
+                except RECONNECT_ERRORS as e:
+                    logging.info(f"SMTP connection lost ({str(e)}), reconnecting")
+                    client.close()
+                    self.stats["reconnects"] += 1
+                    client, sent = await self._connect()
+                    await client.send_message(message)
+            except Exception:
+                # Unknown state (e.g. rejected recipient mid-transaction): start fresh next time
+                await self._close(client)
+                raise
+            self.stats["messages"] += 1
+            self._release(client, sent + 1)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for client, _, _ in idle:
+            await self._close(client)
@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+
+# Timestamp storage.
+# Timestamps are stored as native BSON dates so range filters and sorts use
+# the indexes directly. Documents written before that hold ISO 8601 strings
+# until migrate_dates.py has converted them; during the rollout reads go
+# through as_datetime() and range/keyset filters also match the string form.
+# A server started after the migration recorded its completion drops the
+# string branches (see load_migration_state).
+
+MIGRATION_ID = "bson_dates"
+
+# True until the date migration has completed
+legacy_strings = True
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_datetime(value) -> Optional[datetime]:
+    """Aware UTC datetime from a stored timestamp in either format."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        # Motor returns naive UTC unless the client is tz_aware
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _iso(value: datetime) -> str:
+    return as_datetime(value).astimezone(timezone.utc).isoformat()
+
+
+def range_query(field: str, **bounds) -> dict:
+    """Filter on `field` with comparison operators, e.g. range_query("created_at", gte=start, lt=end)."""
+    query = {field: {f"${op}": value for op, value in bounds.items()}}
+    if not legacy_strings:
+        return query
+    legacy = {field: {f"${op}": _iso(value) for op, value in bounds.items()}}
+    return {"$or": [query, legacy]}
+
+
+def keyset_before(field: str, value, last_id) -> dict:
+    """Condition for the page after (value, last_id) when sorting by (field, id) descending."""
+    conditions = [{field: {"$lt": value}}, {field: value, "id": {"$lt": last_id}}]
+    if legacy_strings and isinstance(value, datetime):
+        # Legacy ISO strings sort below every date
+        conditions.append({field: {"$type": "string"}})
+    if value is not None:
+        # Null/missing sorts below every other value (e.g. posts published
+        # before published_at was always set); $lt never matches across types
+        conditions.append({field: None})
+    return {"$or": conditions}
+
+
+async def load_migration_state(db):
+    global legacy_strings
+    record = await db.migrations.find_one({"id": MIGRATION_ID}, {"_id": 0, "completed_at": 1})
+    legacy_strings = not (record and record.get("completed_at"))
+    if legacy_strings:
+        logging.info("Date migration not completed yet, queries also match ISO string timestamps")
@@ -18,11 +18,21 @@ const AdminDashboard = () => {
       return;
     }
     fetchBlogs();
-    fetchUnviewedCount();
-    
-    // Poll for new orders every 30 seconds
-    const interval = setInterval(fetchUnviewedCount, 30000);
-    return () => clearInterval(interval);
+
+    if (typeof EventSource === 'undefined') {
+      // No SSE support: fall back to polling the badge count
+      fetchUnviewedCount();
+      const interval = setInterval(fetchUnviewedCount, 30000);
+      return () => clearInterval(interval);
+    }
+
+    // Every order event carries the current unviewed count; the browser
+    // reconnects on its own and gets a fresh snapshot
+    const source = new EventSource(`${API}/orders/events`);
+    const updateCount = (event) => setUnviewedOrdersCount(JSON.parse(event.data).unviewed_count);
+    ['snapshot', 'order_stats', 'order_created', 'order_paid', 'order_status_changed', 'order_viewed', 'order_updated', 'order_deleted']
+      .forEach(name => source.addEventListener(name, updateCount));
+    return () => source.close();
   }, [navigate]);
 
   const fetchBlogs = async () => {
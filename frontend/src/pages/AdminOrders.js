@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import { Leaf, ShoppingBag, LogOut, LayoutDashboard, Package, Tag, Settings, CheckCircle, Clock, X, Trash2 } from 'lucide-react';
@@ -6,29 +6,125 @@ import { Leaf, ShoppingBag, LogOut, LayoutDashboard, Package, Tag, Settings, Che
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Order statuses behind each filter tab (empty = all orders)
+const FILTER_STATUSES = {
+  all: [],
+  completed: ['delivered'],
+  pending: ['pending'],
+  active: ['paid', 'packed', 'shipped', 'in_transit']
+};
+
+const matchesFilter = (order, filter) => {
+  const statuses = FILTER_STATUSES[filter] || [];
+  return statuses.length === 0 || statuses.includes(order.status);
+};
+
 const AdminOrders = () => {
   const [orders, setOrders] = useState([]);
+  const [totalOrders, setTotalOrders] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
-  const [filter, setFilter] = useState('all'); // all, completed, pending, cancelled
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [filter, setFilter] = useState('all'); // all, completed, pending, active
+  const [stats, setStats] = useState(null); // server-side counters for the tab labels
   const [expandedOrder, setExpandedOrder] = useState(null); // For tracking input
   const [trackingInput, setTrackingInput] = useState({});
   const navigate = useNavigate();
+  // Read by the event handlers, which are registered once
+  const filterRef = useRef(filter);
+  // Ignores responses for a filter that is no longer selected
+  const requestRef = useRef(0);
 
   useEffect(() => {
     if (!localStorage.getItem('adminAuth')) {
       navigate('/shroomsadmin');
       return;
     }
-    fetchOrders();
+    fetchStats();
+
+    if (typeof EventSource === 'undefined') return;
+
+    // New and changed orders arrive as events instead of reloading the list
+    const source = new EventSource(`${API}/orders/events`);
+    const handleNewOrder = (event) => {
+      const { order } = JSON.parse(event.data);
+      fetchStats();
+      if (!order || !matchesFilter(order, filterRef.current)) return;
+      if (event.type === 'order_created') setTotalOrders(total => total + 1);
+      setOrders(prev => (prev.some(o => o.id === order.id)
+        ? prev.map(o => (o.id === order.id ? { ...o, ...order } : o))
+        : [order, ...prev]));
+    };
+    const handleChange = (event) => {
+      const { order_id, status, viewed } = JSON.parse(event.data);
+      fetchStats();
+      setOrders(prev => prev.map(o => (o.id === order_id ? { ...o, status, viewed } : o)));
+    };
+    const handleDeleted = (event) => {
+      const { order_id } = JSON.parse(event.data);
+      fetchStats();
+      if (order_id) {
+        setOrders(prev => prev.filter(o => o.id !== order_id));
+      } else {
+        // Change stream deletes carry no order id
+        fetchOrders();
+      }
+    };
+    source.addEventListener('order_created', handleNewOrder);
+    source.addEventListener('order_paid', handleNewOrder);
+    source.addEventListener('order_status_changed', handleChange);
+    source.addEventListener('order_viewed', handleChange);
+    source.addEventListener('order_updated', handleChange);
+    source.addEventListener('order_deleted', handleDeleted);
+    // Counter updates that land after the order change itself
+    source.addEventListener('order_stats', (event) => setStats(JSON.parse(event.data).stats));
+    return () => source.close();
   }, [navigate]);
 
-  const fetchOrders = async () => {
+  // Each tab is its own server-side query, paginated from the start
+  useEffect(() => {
+    if (!localStorage.getItem('adminAuth')) return;
+    filterRef.current = filter;
+    setLoading(true);
+    setNextCursor(null);
+    fetchOrders();
+  }, [filter]);
+
+  const fetchStats = async () => {
+    try {
+      const response = await axios.get(`${API}/orders/stats`);
+      setStats(response.data);
+    } catch (error) {
+      console.error('Error fetching order stats:', error);
+    }
+  };
+
+  const countFor = (tab) => {
+    if (!stats) return '…';
+    const statuses = FILTER_STATUSES[tab];
+    if (statuses.length === 0) return stats.orders;
+    return statuses.reduce((sum, status) => sum + (stats.by_status[status] || 0), 0);
+  };
+
+  const fetchOrders = async (cursor = null) => {
+    const request = ++requestRef.current;
+    const statuses = FILTER_STATUSES[filterRef.current];
     try {
-      const response = await axios.get(`${API}/orders`);
-      setOrders(response.data);
+      const response = await axios.get(`${API}/orders`, {
+        params: {
+          limit: 50,
+          ...(statuses.length ? { status: statuses.join(',') } : {}),
+          ...(cursor ? { cursor } : {})
+        }
+      });
+      if (request !== requestRef.current) return;
+      const { items, total, next_cursor } = response.data;
+      setOrders(prev => cursor ? [...prev, ...items] : items);
+      setTotalOrders(total);
+      setNextCursor(next_cursor);
       
       // Mark all as viewed
-      response.data.forEach(order => {
+      items.forEach(order => {
         if (!order.viewed && order.status === 'completed') {
           axios.post(`${API}/orders/${order.id}/mark-viewed`).catch(err => console.error(err));
         }
@@ -36,10 +132,18 @@ const AdminOrders = () => {
     } catch (error) {
       console.error('Error fetching orders:', error);
     } finally {
-      setLoading(false);
+      if (request === requestRef.current) {
+        setLoading(false);
+        setLoadingMore(false);
+      }
     }
   };
 
+  const loadMoreOrders = () => {
+    setLoadingMore(true);
+    fetchOrders(nextCursor);
+  };
+
   const handleLogout = () => {
     localStorage.removeItem('adminAuth');
     navigate('/shroomsadmin');
@@ -53,6 +157,8 @@ const AdminOrders = () => {
     try {
       await axios.delete(`${API}/orders/${orderId}`);
       setOrders(orders.filter(order => order.id !== orderId));
+      setTotalOrders(total => total - 1);
+      fetchStats();
     } catch (error) {
       console.error('Error deleting order:', error);
       alert('Fehler beim Löschen der Bestellung');
@@ -65,6 +171,7 @@ const AdminOrders = () => {
       setOrders(orders.map(order => 
         order.id === orderId ? { ...order, status: newStatus } : order
       ));
+      fetchStats();
     } catch (error) {
       console.error('Error updating order status:', error);
       alert('Fehler beim Ändern des Status');
@@ -87,6 +194,7 @@ const AdminOrders = () => {
           status: 'shipped'
         } : order
       ));
+      fetchStats();
       
       alert('Tracking-Info hinzugefügt und Kunde benachrichtigt!');
     } catch (error) {
@@ -114,15 +222,8 @@ const AdminOrders = () => {
     }
   };
 
-  const filteredOrders = filter === 'all' 
-    ? orders 
-    : filter === 'completed'
-    ? orders.filter(order => order.status === 'delivered')
-    : filter === 'pending'
-    ? orders.filter(order => order.status === 'pending')
-    : filter === 'active'
-    ? orders.filter(order => ['paid', 'packed', 'shipped', 'in_transit'].includes(order.status))
-    : orders;
+  // The server filters by status; this only hides orders that changed status since loading
+  const filteredOrders = orders.filter(order => matchesFilter(order, filter));
 
   // Prevent rendering if not authenticated
   if (!localStorage.getItem('adminAuth')) {
@@ -169,25 +270,25 @@ const AdminOrders = () => {
             onClick={() => setFilter('all')}
             className={filter === 'all' ? 'btn btn-primary' : 'btn btn-secondary'}
           >
-            Alle ({orders.length})
+            Alle ({countFor('all')})
           </button>
           <button
             onClick={() => setFilter('completed')}
             className={filter === 'completed' ? 'btn btn-primary' : 'btn btn-secondary'}
           >
-            Abgeschlossen ({orders.filter(o => o.status === 'delivered').length})
+            Abgeschlossen ({countFor('completed')})
           </button>
           <button
             onClick={() => setFilter('pending')}
             className={filter === 'pending' ? 'btn btn-primary' : 'btn btn-secondary'}
           >
-            Ausstehend ({orders.filter(o => o.status === 'pending').length})
+            Ausstehend ({countFor('pending')})
           </button>
           <button
             onClick={() => setFilter('active')}
             className={filter === 'active' ? 'btn btn-primary' : 'btn btn-secondary'}
           >
-            In Bearbeitung ({orders.filter(o => ['paid', 'packed', 'shipped', 'in_transit'].includes(o.status)).length})
+            In Bearbeitung ({countFor('active')})
           </button>
         </div>
 
@@ -405,6 +506,13 @@ const AdminOrders = () => {
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <div style={{ textAlign: 'center', marginTop: '1rem' }}>
+                <button onClick={loadMoreOrders} className="btn btn-secondary" disabled={loadingMore}>
+                  {loadingMore ? 'Lade...' : `Weitere Bestellungen laden (${orders.length} von ${totalOrders})`}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -43,23 +43,70 @@ const CreateBlog = () => {
     }
   };
 
+  const applyGenerationResult = (job) => {
+    setGeneratedBlog(job);
+    setTitle(job.title);
+    setContent(job.content);
+    setShowPreview(true);
+    setLoading(false);
+  };
+
+  const failGeneration = (message) => {
+    console.error('Error generating blog:', message);
+    setError('Failed to generate blog. Please try again.');
+    setLoading(false);
+  };
+
+  // Fallback when the event stream is unavailable: poll the job status
+  const pollGenerationJob = async (jobId) => {
+    try {
+      const response = await axios.get(`${API}/blogs/generate/${jobId}`);
+      const job = response.data;
+      if (job.status === 'done') {
+        applyGenerationResult(job);
+      } else if (job.status === 'failed') {
+        failGeneration(job.error);
+      } else {
+        setContent(job.content);
+        setTimeout(() => pollGenerationJob(jobId), 1500);
+      }
+    } catch (error) {
+      failGeneration(error);
+    }
+  };
+
   const handleGenerateAI = async (e) => {
     e.preventDefault();
     setLoading(true);
     setError('');
     setGeneratedBlog(null);
+    setContent('');
 
     try {
+      // Generation runs as a background job; follow its tokens via SSE
       const response = await axios.post(`${API}/blogs/generate`, { keywords });
-      setGeneratedBlog(response.data);
-      setTitle(response.data.title);
-      setContent(response.data.content);
-      setShowPreview(true);
+      const jobId = response.data.job_id;
+      let streamed = '';
+      const source = new EventSource(`${API}/blogs/generate/${jobId}/stream`);
+      source.addEventListener('token', (event) => {
+        streamed += JSON.parse(event.data).text;
+        setContent(streamed);
+      });
+      source.addEventListener('done', (event) => {
+        source.close();
+        applyGenerationResult(JSON.parse(event.data));
+      });
+      source.addEventListener('error', (event) => {
+        source.close();
+        if (event.data) {
+          failGeneration(JSON.parse(event.data).error);
+        } else {
+          // Connection dropped (no payload): keep going by polling
+          pollGenerationJob(jobId);
+        }
+      });
     } catch (error) {
-      console.error('Error generating blog:', error);
-      setError('Failed to generate blog. Please try again.');
-    } finally {
-      setLoading(false);
+      failGeneration(error);
     }
   };
 
@@ -216,6 +263,12 @@ const CreateBlog = () => {
                 Generating your blog post... This may take a moment.
               </div>
             )}
+
+            {loading && content && (
+              <div style={{ marginTop: '1rem', opacity: 0.8 }} data-testid="streaming-preview">
+                <ReactMarkdown>{content}</ReactMarkdown>
+              </div>
+            )}
           </div>
         )}
 